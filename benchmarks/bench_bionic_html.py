@@ -0,0 +1,66 @@
+import argparse
+import random
+import timeit
+
+import lxml.html as html
+
+from benchmarks.corpus import WORDS
+from blog_uploader.bionic import clean_html
+
+
+def legacy_clean_html(content: bytes) -> str:
+    tree = html.fragment_fromstring(content)
+    for c in tree.xpath("//comment()"):
+        c.getparent().remove(c)
+    for s in tree.xpath("//*[@style]"):
+        del s.attrib["style"]
+
+    (root,) = tree.xpath('//div[contains(@class, "bionic-reader-container")]')
+    return (
+        root.text.lstrip()
+        + "".join(html.tostring(e, encoding="unicode") for e in root.iterchildren())
+        + root.tail.rstrip()
+    )
+
+
+def recorded_response(words: int, *, seed: int = 0) -> bytes:
+    # mirrors the markup the Bionic Reading API returns for request_type=html
+    rng = random.Random(seed)
+    spans = []
+    for _ in range(words):
+        word = rng.choice(WORDS)
+        cut = (len(word) + 1) // 2
+        spans.append(
+            f'<b class="b bionic" style="font-weight: 700">{word[:cut]}</b>{word[cut:]} '
+        )
+        if rng.random() < 0.05:
+            spans.append("<!-- bionic -->")
+    return (
+        '<div class="bionic-reader bionic-reader-6dd2b7" style="display: block">'
+        '<div class="bionic-reader-content">'
+        '<div class="bionic-reader-container"> '
+        + "".join(spans)
+        + "</div>\n</div><!-- powered by bionic reading --></div>"
+    ).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-w", "--words", type=int, nargs="+", default=[10, 80, 400])
+    parser.add_argument("-n", "--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    for words in args.words:
+        content = recorded_response(words)
+        assert clean_html(content) == legacy_clean_html(content)
+
+        for name, fn in [("xpath", legacy_clean_html), ("single pass", clean_html)]:
+            seconds = timeit.timeit(lambda: fn(content), number=args.number)
+            print(
+                f"{words:>5} words {name:>12}: "
+                f"{seconds / args.number * 1e6:8.1f} us per response"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from benchmarks.corpus import generate_post
+
+CHILD = """
+import resource, sys
+from pathlib import Path
+from blog_uploader.document import markdown_to_doc
+from blog_uploader.embedders import Embedder
+
+# the link makes the embedder rewrite the AST so both modes render with pandoc
+post = markdown_to_doc(
+    Path(sys.argv[1]), pandoc_filters=[Embedder()], low_memory=sys.argv[2] == "1"
+)
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, len(post.body))
+"""
+
+
+def peak_rss(path: Path, low_memory: bool) -> tuple[int, int]:
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, str(path), "1" if low_memory else "0"],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    rss, body = out.split()
+    return int(rss), int(body)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-t", "--tables", type=int, nargs="+", default=[10, 50, 200, 800]
+    )
+    parser.add_argument("-r", "--rows", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'input':>10} {'buffered':>12} {'streaming':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for tables in args.tables:
+            path = Path(tmp) / f"post-{tables}.md"
+            path.write_text(
+                generate_post(tables, tables=tables, table_rows=args.rows)
+                + "\n[video](https://www.youtube.com/watch?v=x)\n"
+            )
+            buffered, _ = peak_rss(path, False)
+            streaming, _ = peak_rss(path, True)
+            size = path.stat().st_size
+            print(
+                f"{size / 1024:>8.0f}KB {buffered / 1024:>10.1f}MB "
+                f"{streaming / 1024:>10.1f}MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
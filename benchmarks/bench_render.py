@@ -0,0 +1,82 @@
+import argparse
+import json
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.corpus import write_corpus
+from blog_uploader.document import doc_to_markdown, process_doc, source_body
+from blog_uploader.exceptions import PostException
+from blog_uploader.pandoc import create_backend, use_backend
+
+
+def legacy_doc_to_markdown(doc: dict) -> str:
+    with subprocess.Popen(
+        ["pandoc", "-f", "json", "-t", "gfm"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        encoding="utf8",
+    ) as p:
+        output, error = p.communicate(json.dumps(doc))
+        if p.returncode != 0:
+            raise PostException(error)
+    return output
+
+
+def legacy(path: Path) -> str:
+    _, _, doc = process_doc(path)
+    return legacy_doc_to_markdown(doc)
+
+
+def rerender(path: Path) -> str:
+    _, _, doc = process_doc(path)
+    return doc_to_markdown(doc)
+
+
+def untouched(path: Path) -> str:
+    source = path.read_bytes()
+    process_doc(path, source)
+    return source_body(source) or ""
+
+
+def measure(fn, paths: list[Path], repeat: int) -> list[float]:
+    timings = []
+    for _ in range(repeat):
+        for path in paths:
+            start = time.perf_counter()
+            fn(path)
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="*", type=Path)
+    parser.add_argument("-n", "--posts", type=int, default=10)
+    parser.add_argument("-s", "--paragraphs", type=int, default=200)
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("-w", "--pandoc-workers", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, use_backend(
+        create_backend(args.pandoc_workers)
+    ):
+        paths = args.files or write_corpus(Path(tmp), args.posts, args.paragraphs)
+
+        for name, fn in [
+            ("two pandoc runs, json", legacy),
+            ("two pandoc runs, orjson", rerender),
+            ("one pandoc run", untouched),
+        ]:
+            timings = measure(fn, paths, args.repeat)
+            print(
+                f"{name:>24}: mean {statistics.mean(timings) * 1000:8.2f} ms, "
+                f"median {statistics.median(timings) * 1000:8.2f} ms per post"
+            )
+
+
+if __name__ == "__main__":
+    main()
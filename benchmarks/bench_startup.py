@@ -0,0 +1,86 @@
+import argparse
+import re
+import subprocess
+import sys
+
+# import budget in milliseconds and modules an action must not import
+ACTIONS: dict[str, tuple[float, tuple[str, ...]]] = {
+    "create": (
+        120.0,
+        ("pymongo", "gridfs", "lxml", "pandocfilters", "pendulum", "requests"),
+    ),
+    "publish": (250.0, ("lxml", "requests", "boto3")),
+    "delete": (250.0, ("lxml", "requests", "boto3")),
+    "upload": (400.0, ("boto3",)),
+    "watch": (400.0, ("boto3",)),
+    "export": (300.0, ("gridfs", "requests", "boto3")),
+    "migrate": (200.0, ("lxml", "pandocfilters", "requests", "boto3")),
+    "gc": (200.0, ("lxml", "pandocfilters", "requests", "boto3")),
+}
+
+LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def import_profile(action: str) -> tuple[float, set[str]]:
+    stderr = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            f"import blog_uploader.__main__, blog_uploader.commands.{action}",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stderr
+
+    total = 0
+    modules = set()
+    started = False
+    for line in stderr.splitlines():
+        match = LINE_RE.match(line)
+        if match is None:
+            continue
+        _, cumulative, indent, name = match.groups()
+        if started:
+            modules.add(name)
+            if len(indent) == 1:
+                total += int(cumulative)
+        elif name == "site" and len(indent) == 1:
+            # everything before site is interpreter startup
+            started = True
+    return total / 1000, modules
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--repeat", type=int, default=5)
+    parser.add_argument(
+        "--check", action="store_true", help="exit nonzero when a budget is exceeded"
+    )
+    parser.add_argument("actions", nargs="*", default=list(ACTIONS))
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'action':<10} {'import':>10} {'budget':>10} {'modules':>8}  forbidden")
+    for action in args.actions:
+        budget, forbidden = ACTIONS[action]
+        runs = [import_profile(action) for _ in range(args.repeat)]
+        elapsed = min(ms for ms, _ in runs)
+        modules = runs[0][1]
+        loaded = sorted(m for m in forbidden if m in modules)
+
+        over = elapsed > budget or loaded
+        failed = failed or bool(over)
+        print(
+            f"{action:<10} {elapsed:>8.1f}ms {budget:>8.1f}ms {len(modules):>8}  "
+            f"{', '.join(loaded) or '-'}{'  REGRESSION' if over else ''}"
+        )
+
+    if args.check and failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
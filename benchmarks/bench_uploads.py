@@ -0,0 +1,97 @@
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.corpus import write_image
+from benchmarks.standins import StubServer, redirect
+
+CHILD = """
+import sys, tracemalloc
+from benchmarks.standins import redirect
+from blog_uploader.image_uploaders.imgbb_uploader import ImgbbUploader
+from blog_uploader.image_uploaders.imgur_uploader import ImgurUploader
+
+backend, url, path = sys.argv[1:]
+cls = {"imgbb": ImgbbUploader, "imgur": ImgurUploader}[backend]
+uploader = redirect(cls("bench"), url)
+
+tracemalloc.start()
+with open(path, "rb") as f:
+    link = uploader.upload(f)
+print(tracemalloc.get_traced_memory()[1], link.rsplit("/", 1)[1].split(".")[0])
+"""
+
+UPLOADERS = ("imgbb", "imgur")
+
+
+def peak_memory(backend: str, url: str, path: Path) -> tuple[int, int]:
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, backend, url, str(path)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    peak, received = out.split()
+    return int(peak), int(received)
+
+
+def upload_many(backend: str, url: str, paths: list[Path]) -> float:
+    from blog_uploader.image_uploaders.imgbb_uploader import ImgbbUploader
+    from blog_uploader.image_uploaders.imgur_uploader import ImgurUploader
+
+    cls = {"imgbb": ImgbbUploader, "imgur": ImgurUploader}[backend]
+    with redirect(cls("bench"), url) as uploader:
+        files = [open(path, "rb") for path in paths]
+        try:
+            start = time.perf_counter()
+            uploader.upload_many(files)
+            return time.perf_counter() - start
+        finally:
+            for f in files:
+                f.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-s", "--sizes", type=float, nargs="+", default=[1, 8, 32], help="MiB"
+    )
+    parser.add_argument("-n", "--images", type=int, default=32)
+    parser.add_argument(
+        "--failures", type=int, default=1, help="503s the stub answers first"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'backend':<8} {'image':>10} {'peak':>10} {'ratio':>7}  received")
+        for size in args.sizes:
+            path = write_image(Path(tmp) / f"{size}.png", int(size * 1024 * 1024))
+            for backend in UPLOADERS:
+                with StubServer(failures=args.failures) as stub:
+                    peak, received = peak_memory(backend, stub.url, path)
+                nbytes = path.stat().st_size
+                print(
+                    f"{backend:<8} {nbytes / 1024 / 1024:>8.1f}MB "
+                    f"{peak / 1024 / 1024:>8.2f}MB {peak / nbytes:>7.3f}  "
+                    + ("ok" if received == nbytes else f"MISMATCH ({received})")
+                )
+
+        paths = [
+            write_image(Path(tmp) / f"many-{i}.png", 256 * 1024, seed=i)
+            for i in range(args.images)
+        ]
+        print()
+        for backend in UPLOADERS:
+            with StubServer() as stub:
+                elapsed = upload_many(backend, stub.url, paths)
+            print(
+                f"{backend:<8} upload_many of {len(paths)} images in "
+                f"{elapsed * 1000:.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
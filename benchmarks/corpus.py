@@ -0,0 +1,124 @@
+import random
+from pathlib import Path
+from typing import Sequence
+
+from bson.objectid import ObjectId
+
+__all__ = ["generate_post", "write_corpus", "write_image"]
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud"
+).split()
+
+
+def _sentence(rng: random.Random, n: int = 12) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def _table(rng: random.Random, rows: int, columns: int = 5) -> list[str]:
+    lines = [
+        "| " + " | ".join(rng.choice(WORDS) for _ in range(columns)) + " |",
+        "|" + "---|" * columns,
+    ]
+    for _ in range(rows):
+        lines.append(
+            "| "
+            + " | ".join(str(rng.randint(0, 10**6)) for _ in range(columns))
+            + " |"
+        )
+    lines.append("")
+    return lines
+
+
+LINKS = (
+    "https://example.com/{word}",
+    "https://www.youtube.com/watch?v={word}",
+    "https://en.wikipedia.org/wiki/{word}",
+    "https://vimeo.com/{number}",
+)
+
+
+def _link(rng: random.Random) -> str:
+    word = rng.choice(WORDS)
+    url = rng.choice(LINKS).format(word=word, number=rng.randint(10**6, 10**8))
+    return f"[{word}]({url})"
+
+
+def generate_post(
+    paragraphs: int = 20,
+    *,
+    tables: int = 0,
+    table_rows: int = 20,
+    images: Sequence[str] = (),
+    links: int = 0,
+    seed: int = 0,
+) -> str:
+    rng = random.Random(seed)
+    lines = [
+        "---",
+        f"id: {ObjectId()}",
+        "tags:",
+        "- benchmark",
+        f"- {rng.choice(WORDS)}",
+        f"summary: {_sentence(rng, 8)}",
+        "---",
+        "",
+        f"# {_sentence(rng, 4)[:-1]}",
+        "",
+    ]
+    # links and images are spread evenly over the paragraphs
+    link_at = {i * paragraphs // links for i in range(links)} if links else set()
+    image_at = {i * paragraphs // len(images): name for i, name in enumerate(images)}
+    for i in range(paragraphs):
+        if i % 5 == 4:
+            lines.append(f"## {_sentence(rng, 3)[:-1]}")
+        else:
+            sentences = [_sentence(rng) for _ in range(rng.randint(2, 6))]
+            if i in link_at:
+                sentences.insert(1, _link(rng))
+            lines.append(" ".join(sentences))
+        lines.append("")
+        if i in image_at:
+            lines.extend([f"![{rng.choice(WORDS)}]({image_at[i]})", ""])
+        if tables and i % max(paragraphs // tables, 1) == 0:
+            lines.extend(_table(rng, table_rows))
+    return "\n".join(lines)
+
+
+def write_image(path: Path, size: int, *, seed: int = 0) -> Path:
+    path.write_bytes(random.Random(seed).randbytes(size))
+    return path
+
+
+def write_corpus(
+    directory: Path,
+    count: int,
+    paragraphs: int = 20,
+    *,
+    tables: int = 0,
+    table_rows: int = 20,
+    images: int = 0,
+    image_size: int = 64 * 1024,
+    links: int = 0,
+) -> list[Path]:
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(count):
+        names = [f"image-{i:04d}-{k}.png" for k in range(images)]
+        for k, name in enumerate(names):
+            write_image(directory / name, image_size, seed=i * 1000 + k)
+
+        path = directory / f"post-{i:04d}.md"
+        path.write_text(
+            generate_post(
+                paragraphs,
+                tables=tables,
+                table_rows=table_rows,
+                images=names,
+                links=links,
+                seed=i,
+            )
+        )
+        paths.append(path)
+    return paths
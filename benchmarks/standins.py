@@ -0,0 +1,191 @@
+import base64
+import json
+import threading
+from contextlib import contextmanager
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator, Optional, TypeVar, cast
+from urllib.parse import parse_qs, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from benchmarks.bench_bionic_html import recorded_response
+
+__all__ = ["StubServer", "mongo_database", "redirect", "s3_client"]
+
+S = TypeVar("S", bound=requests.Session)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: "_Server"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, body: bytes, content_type: str = "application/json"):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        # public Bionic session token
+        self._reply(b"token", "text/plain")
+
+    def _image(self, body: bytes) -> bytes:
+        # the decoded upload, so callers can check what arrived
+        message = BytesParser(policy=policy.default).parsebytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body
+        )
+        for part in message.iter_parts():
+            if part.get_param("name", header="content-disposition") == "image":
+                data = part.get_payload(decode=True)
+                if not isinstance(data, bytes):
+                    return b""
+                return data if part.get_filename() else base64.b64decode(data)
+        return b""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.requests += 1
+
+        if self.server.failures > 0:
+            self.server.failures -= 1
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        match self.path.split("?")[0]:
+            case "/1/upload":
+                n = self.server.requests
+                size = len(self._image(body))
+                self._reply(
+                    json.dumps(
+                        {
+                            "data": {
+                                "id": str(n),
+                                "url": f"https://i.ibb.co/{n}/{size}.png",
+                                "delete_url": f"https://ibb.co/{n}/delete",
+                            },
+                            "success": True,
+                            "status": 200,
+                        }
+                    ).encode()
+                )
+            case "/3/upload":
+                n = self.server.requests
+                size = len(self._image(body))
+                self._reply(
+                    json.dumps(
+                        {
+                            "data": {
+                                "link": f"https://i.imgur.com/{n}/{size}.png",
+                                "deletehash": str(n),
+                            },
+                            "success": True,
+                            "status": 200,
+                        }
+                    ).encode()
+                )
+            case "/convert" | "/v1/convert":
+                content = parse_qs(body.decode()).get("content", [""])[0]
+                self._reply(
+                    recorded_response(max(len(content.split()), 1)), "text/html"
+                )
+            case _:
+                self.send_error(404)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, failures: int):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.requests = 0
+        # the first uploads are answered with 503 to exercise retries
+        self.failures = failures
+
+
+class StubServer:
+    def __init__(self, *, failures: int = 0):
+        self.server = _Server(failures)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _RedirectAdapter(HTTPAdapter):
+    def __init__(self, base_url: str, **kwargs):
+        super().__init__(**kwargs)
+        self.base = urlsplit(base_url)
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        request.url = urlunsplit(
+            url._replace(scheme=self.base.scheme, netloc=self.base.netloc)
+        )
+        return super().send(request, **kwargs)
+
+
+def redirect(session: S, base_url: str) -> S:
+    # sends the session's https requests to the stub server, keeping the paths
+    # and the pool and retry settings of the adapter it replaces
+    adapter = cast(HTTPAdapter, session.get_adapter("https://"))
+    session.mount(
+        "https://",
+        _RedirectAdapter(
+            base_url,
+            pool_maxsize=adapter.poolmanager.connection_pool_kw.get("maxsize", 10),
+            pool_block=adapter.poolmanager.connection_pool_kw.get("block", False),
+            max_retries=adapter.max_retries,
+        ),
+    )
+    return session
+
+
+@contextmanager
+def mongo_database(uri: Optional[str] = None) -> Iterator[Any]:
+    if uri is not None:
+        from pymongo import MongoClient
+
+        client: MongoClient[dict] = MongoClient(uri)
+        with client:
+            client.drop_database("blog_uploader_bench")
+            yield client.blog_uploader_bench
+            client.drop_database("blog_uploader_bench")
+        return
+
+    import mongomock
+    import mongomock.gridfs
+
+    mongomock.gridfs.enable_gridfs_integration()
+    yield mongomock.MongoClient().blog_uploader_bench
+
+
+@contextmanager
+def s3_client(bucket: str) -> Iterator[Any]:
+    import boto3
+    from moto import mock_aws
+
+    with mock_aws():
+        client = boto3.client(
+            "s3",
+            region_name="us-east-1",
+            aws_access_key_id="bench",
+            aws_secret_access_key="bench",
+        )
+        client.create_bucket(Bucket=bucket)
+        yield client
@@ -0,0 +1,356 @@
+import argparse
+import copy
+import datetime
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional
+
+import orjson
+
+from benchmarks.corpus import write_corpus
+from benchmarks.standins import StubServer, mongo_database, redirect, s3_client
+from blog_uploader.bionic import Bionic
+from blog_uploader.document import (
+    build_post,
+    doc_to_markdown,
+    markdown_to_ast,
+    markdown_to_doc,
+    parse_metadata,
+    split_title,
+)
+from blog_uploader.embedders import Embedder
+from blog_uploader.image_uploaders import ImageUploader
+from blog_uploader.image_uploaders.directory_uploader import DirectoryUploader
+from blog_uploader.image_uploaders.optimizer import ImageOptimizer
+from blog_uploader.image_uploaders.stage import ImageStage
+from blog_uploader.pandoc import create_backend, use_backend
+from blog_uploader.pipeline import FilterPipeline
+
+FORMAT_VERSION = 1
+
+
+class NullUploader(ImageUploader):
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def upload(self, file):
+        return f"https://example.com/{Path(file.name).name}"
+
+
+def measure(
+    fn: Callable,
+    inputs: Iterable[Any],
+    *,
+    repeat: int = 1,
+    setup: Optional[Callable[[Any], tuple]] = None,
+) -> list[float]:
+    inputs = list(inputs)
+    timings = []
+    for _ in range(repeat):
+        for x in inputs:
+            # setup runs outside the timed region, e.g. to copy a document
+            args = setup(x) if setup is not None else (x,)
+            start = time.perf_counter()
+            fn(*args)
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summarize(timings: list[float]) -> dict[str, float]:
+    ordered = sorted(timings)
+    return {
+        "n": len(ordered),
+        "total": sum(ordered),
+        "mean": statistics.fmean(ordered),
+        "median": statistics.median(ordered),
+        "min": ordered[0],
+        "max": ordered[-1],
+        "p95": ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)],
+        "stdev": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+    }
+
+
+class Suite:
+    def __init__(self, selected: list[str], repeat: int):
+        self.selected = selected
+        self.repeat = repeat
+        self.stages: dict[str, dict] = {}
+
+    def wants(self, name: str) -> bool:
+        return not self.selected or any(s in name for s in self.selected)
+
+    def record(self, name: str, timings: list[float]):
+        if not self.wants(name):
+            return
+        self.stages[name] = stats = summarize(timings)
+        print(
+            f"{name:<32} median {stats['median'] * 1000:9.3f} ms (n={stats['n']})",
+            file=sys.stderr,
+        )
+
+    def run(self, name: str, fn: Callable, inputs: Iterable[Any], **kwargs):
+        if self.wants(name):
+            self.record(name, measure(fn, inputs, repeat=self.repeat, **kwargs))
+
+    def skip(self, name: str, reason: str):
+        if self.wants(name):
+            self.stages[name] = {"skipped": reason}
+            print(f"{name:<32} skipped: {reason}", file=sys.stderr)
+
+
+def bench_conversion(suite: Suite, paths: list[Path], stub_url: str):
+    suite.run("markdown_to_ast", markdown_to_ast, paths)
+
+    docs = {path: split_title(markdown_to_ast(path)) for path in paths}
+    suite.run("parse_metadata", parse_metadata, [meta for meta, _, _ in docs.values()])
+
+    def bionic():
+        return redirect(Bionic("bench"), stub_url)
+
+    filters: dict[str, Callable[[Path], Callable]] = {
+        "ImageStage": lambda path: ImageStage(NullUploader(), path.parent),
+        "Embedder": lambda path: Embedder(),
+        "Bionic": lambda path: bionic(),
+    }
+    for name, factory in filters.items():
+        suite.run(
+            f"filter:{name}",
+            lambda pipeline, doc, meta: pipeline(doc, meta=meta),
+            paths,
+            setup=lambda path: (
+                FilterPipeline([factory(path)]),
+                copy.deepcopy(docs[path][2]),
+                docs[path][0],
+            ),
+        )
+
+    rendered = {}
+    for path, (meta, _, doc) in docs.items():
+        rendered[path] = copy.deepcopy(doc)
+        FilterPipeline([ImageStage(NullUploader(), path.parent), Embedder()])(
+            rendered[path], meta=meta
+        )
+    suite.run("doc_to_markdown", doc_to_markdown, rendered.values())
+
+    bodies = {path: doc_to_markdown(doc) for path, doc in rendered.items()}
+    suite.run(
+        "build_post",
+        build_post,
+        paths,
+        setup=lambda path: (
+            path,
+            docs[path][1],
+            bodies[path],
+            parse_metadata(docs[path][0]),
+        ),
+    )
+
+    suite.run("markdown_to_doc", markdown_to_doc, paths)
+
+
+def bench_uploaders(
+    suite: Suite,
+    stack: ExitStack,
+    images: list[Path],
+    output: Path,
+    stub_url: str,
+    mongodb_uri: Optional[str],
+):
+    uploaders: dict[str, Callable[[], ImageUploader]] = {
+        "DirectoryUploader": lambda: DirectoryUploader(output / "images"),
+    }
+
+    def gridfs():
+        from blog_uploader.image_uploaders.gridfs_uploader import GridFsUploader
+
+        return GridFsUploader(stack.enter_context(mongo_database(mongodb_uri)))
+
+    def registry():
+        from blog_uploader.image_uploaders.gridfs_uploader import GridFsUploader
+        from blog_uploader.image_uploaders.registry import ImageRegistry
+
+        db = stack.enter_context(mongo_database(mongodb_uri))
+        return ImageRegistry(db, GridFsUploader(db))
+
+    def s3():
+        from blog_uploader.image_uploaders.s3_uploader import S3Uploader
+
+        client = stack.enter_context(s3_client("bench"))
+        return S3Uploader("bench", "bench", "bench", client=client)
+
+    def imgbb():
+        from blog_uploader.image_uploaders.imgbb_uploader import ImgbbUploader
+
+        return redirect(ImgbbUploader("bench"), stub_url)
+
+    def imgur():
+        from blog_uploader.image_uploaders.imgur_uploader import ImgurUploader
+
+        return redirect(ImgurUploader("bench"), stub_url)
+
+    uploaders.update(
+        GridFsUploader=gridfs,
+        ImageRegistry=registry,
+        S3Uploader=s3,
+        ImgbbUploader=imgbb,
+        ImgurUploader=imgur,
+    )
+
+    def upload(uploader: ImageUploader, path: Path):
+        with open(path, "rb") as f:
+            uploader.upload(f)
+
+    for name, factory in uploaders.items():
+        if not any(suite.wants(f"uploader:{name}:{s}") for s in ("cold", "warm")):
+            continue
+        try:
+            uploader = factory()
+        except ImportError as e:
+            suite.skip(f"uploader:{name}", f"missing {e.name}")
+            continue
+
+        # the first pass stores every image, the second finds them all stored
+        for state in ("cold", "warm"):
+            suite.record(
+                f"uploader:{name}:{state}",
+                measure(lambda p: upload(uploader, p), images),
+            )
+
+
+def bench_optimizer(suite: Suite, directory: Path, count: int):
+    if not any(suite.wants(f"optimizer:{s}") for s in ("cold", "warm")):
+        return
+    try:
+        from PIL import Image
+    except ImportError as e:
+        suite.skip("optimizer", f"missing {e.name}")
+        return
+
+    # the corpus images are random bytes, so decodable screenshots are drawn here
+    directory.mkdir(parents=True, exist_ok=True)
+    images = []
+    for i in range(count):
+        path = directory / f"screenshot-{i}.png"
+        Image.effect_mandelbrot((2400, 1600), (-2 + i / 10, -1, 1, 1), 64).save(path)
+        images.append(path)
+
+    with ImageOptimizer(directory / "cache") as optimizer:
+        for state in ("cold", "warm"):
+            suite.record(f"optimizer:{state}", measure(optimizer.optimize, images))
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> bool:
+    regressed = False
+    print(f"{'stage':<32} {'baseline':>12} {'current':>12} {'ratio':>7}")
+    for name, stats in results["stages"].items():
+        before = baseline["stages"].get(name)
+        if before is None or "median" not in before or "median" not in stats:
+            continue
+        ratio = stats["median"] / before["median"] if before["median"] else 1.0
+        flag = ratio > 1 + tolerance
+        regressed = regressed or flag
+        print(
+            f"{name:<32} {before['median'] * 1000:10.3f}ms {stats['median'] * 1000:10.3f}ms "
+            f"{ratio:6.2f}x{'  REGRESSION' if flag else ''}"
+        )
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--posts", type=int, default=20)
+    parser.add_argument("-s", "--paragraphs", type=int, default=40)
+    parser.add_argument("--images", type=int, default=4, help="images per post")
+    parser.add_argument("--image-size", type=int, default=64 * 1024)
+    parser.add_argument("--links", type=int, default=8, help="links per post")
+    parser.add_argument("--tables", type=int, default=2, help="tables per post")
+    parser.add_argument("--table-rows", type=int, default=20)
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("-w", "--pandoc-workers", type=int, default=0)
+    parser.add_argument("--mongodb-uri", help="use this mongod instead of mongomock")
+    parser.add_argument(
+        "-k", "--stage", action="append", default=[], help="only run matching stages"
+    )
+    parser.add_argument("-o", "--output", type=Path, help="write results as JSON")
+    parser.add_argument("--compare", type=Path, help="baseline results to compare")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="allowed slowdown of a stage's median before it counts as a regression",
+    )
+    args = parser.parse_args()
+
+    corpus = {
+        "posts": args.posts,
+        "paragraphs": args.paragraphs,
+        "images": args.images,
+        "image_size": args.image_size,
+        "links": args.links,
+        "tables": args.tables,
+        "table_rows": args.table_rows,
+    }
+    suite = Suite(args.stage, args.repeat)
+
+    with ExitStack() as stack:
+        tmp = Path(stack.enter_context(tempfile.TemporaryDirectory()))
+        stack.enter_context(use_backend(create_backend(args.pandoc_workers)))
+        stub = stack.enter_context(StubServer())
+
+        paths = write_corpus(
+            tmp / "posts",
+            args.posts,
+            args.paragraphs,
+            tables=args.tables,
+            table_rows=args.table_rows,
+            images=args.images,
+            image_size=args.image_size,
+            links=args.links,
+        )
+        images = sorted((tmp / "posts").glob("*.png"))
+
+        bench_conversion(suite, paths, stub.url)
+        bench_uploaders(suite, stack, images, tmp / "out", stub.url, args.mongodb_uri)
+        bench_optimizer(suite, tmp / "screenshots", max(args.images, 1))
+
+    results = {
+        "version": FORMAT_VERSION,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus": corpus,
+        "repeat": args.repeat,
+        "pandoc_workers": args.pandoc_workers,
+        "stages": suite.stages,
+    }
+
+    data = orjson.dumps(results, option=orjson.OPT_INDENT_2)
+    if args.output is not None:
+        args.output.write_bytes(data)
+    else:
+        sys.stdout.buffer.write(data + b"\n")
+
+    if args.compare is not None:
+        baseline = orjson.loads(args.compare.read_bytes())
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
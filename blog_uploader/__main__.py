@@ -1,80 +1,207 @@
 import argparse
+import os
 from pathlib import Path
-from typing import Callable
 
-from pandocfilters import Image, walk
-from pymongo import MongoClient
+from blog_uploader.commands import Action, load
 
-from blog_uploader import markdown_to_ast, markdown_to_doc
-from blog_uploader.create_post import create_post
-from blog_uploader.embedders import Embedder
-from blog_uploader.image_uploaders.gridfs_uploader import GridFsUploader
-from blog_uploader.schemas import Action
-from blog_uploader.settings import settings
+
+def positive_float(value: str) -> float:
+    number = float(value)
+    if not number > 0:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive number")
+    return number
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if not number > 0:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive integer")
+    return number
+
+
+def non_negative_int(value: str) -> int:
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"{value} is a negative integer")
+    return number
+
+
+# cpu_count is None when the number of CPUs cannot be determined
+PANDOC_WORKERS = os.cpu_count() or 1
 
 parser = argparse.ArgumentParser(prog="blog_uploader")
 
-subparsers = parser.add_subparsers(title="actions", dest="action")
+subparsers = parser.add_subparsers(title="actions", dest="action", required=True)
 create_parser = subparsers.add_parser(Action.create)
 create_parser.add_argument("title")
-
-upload_parser = subparsers.add_parser(Action.upload)
-upload_parser.add_argument("-p", "--publish", action="store_true")
+create_parser.add_argument("file", type=Path)
+
+conversion_parser = argparse.ArgumentParser(add_help=False)
+conversion_parser.add_argument("-p", "--publish", action="store_true")
+conversion_parser.add_argument(
+    "--bionic", action="store_true", help="convert text with the Bionic Reading API"
+)
+conversion_parser.add_argument(
+    "--bionic-rate",
+    type=positive_float,
+    default=5.0,
+    help="maximum Bionic Reading API requests per second",
+)
+conversion_parser.add_argument(
+    "--pandoc-workers",
+    type=non_negative_int,
+    default=PANDOC_WORKERS,
+    help="resident pandoc servers to convert with, 0 runs pandoc per conversion",
+)
+
+image_parser = argparse.ArgumentParser(add_help=False)
+image_parser.add_argument(
+    "--optimize-images",
+    action="store_true",
+    help="strip, resize and transcode images into responsive variants (needs Pillow)",
+)
+image_parser.add_argument(
+    "--image-widths",
+    type=int,
+    nargs="+",
+    default=[480, 960, 1600],
+    metavar="WIDTH",
+    help="widths of the responsive variants, never larger than the original",
+)
+image_parser.add_argument(
+    "--image-formats",
+    nargs="+",
+    choices=["avif", "webp", "jpeg", "png"],
+    default=["webp"],
+    metavar="FORMAT",
+    help="formats to transcode to, in order of preference (avif, webp, jpeg, png)",
+)
+
+upload_parser = subparsers.add_parser(
+    Action.upload, parents=[conversion_parser, image_parser]
+)
+upload_parser.add_argument(
+    "-j",
+    "--jobs",
+    type=positive_int,
+    default=None,
+    help="number of concurrent conversions",
+)
+upload_parser.add_argument(
+    "-f", "--force", action="store_true", help="ignore the upload manifest"
+)
+upload_parser.add_argument(
+    "--low-memory",
+    action="store_true",
+    help="stream each post through pandoc instead of holding its whole AST",
+)
+upload_parser.add_argument(
+    "--async",
+    dest="use_async",
+    action="store_true",
+    help="run conversions and writes concurrently on one event loop",
+)
+upload_parser.add_argument(
+    "--profile",
+    type=argparse.FileType("w"),
+    metavar="FILE",
+    help="write per-post stage timings as JSON lines ('-' for stdout)",
+)
+upload_parser.add_argument(
+    "--cprofile",
+    metavar="FILE",
+    help="write cProfile stats covering every thread to FILE",
+)
+upload_parser.add_argument(
+    "files", nargs="+", help="markdown files, directories, or glob patterns"
+)
+
+watch_parser = subparsers.add_parser(
+    Action.watch, parents=[conversion_parser, image_parser]
+)
+watch_parser.add_argument(
+    "--debounce",
+    type=float,
+    default=0.3,
+    help="seconds a file must be quiet before it is uploaded",
+)
+watch_parser.add_argument(
+    "--poll", action="store_true", help="poll for changes instead of using inotify"
+)
+watch_parser.add_argument(
+    "directories",
+    nargs="*",
+    type=Path,
+    default=[Path(".")],
+    help="directories to watch",
+)
+
+export_parser = subparsers.add_parser(Action.export, parents=[image_parser])
+export_parser.add_argument(
+    "-o", "--output", type=Path, default=Path("site"), help="export directory"
+)
+export_parser.add_argument(
+    "-j",
+    "--jobs",
+    type=positive_int,
+    default=None,
+    help="number of concurrent conversions",
+)
+export_parser.add_argument(
+    "-f", "--force", action="store_true", help="rewrite every post"
+)
+export_parser.add_argument(
+    "-p",
+    "--publish",
+    action="store_true",
+    help="export every post as published, otherwise drafts are left out",
+)
+export_parser.add_argument(
+    "--page-size", type=int, default=20, help="posts per listing page"
+)
+export_parser.add_argument(
+    "--base-url", default="/", help="URL the export directory is served from"
+)
+export_parser.add_argument(
+    "--pandoc-workers",
+    type=non_negative_int,
+    default=PANDOC_WORKERS,
+    help="resident pandoc servers to convert with, 0 runs pandoc per conversion",
+)
+export_parser.add_argument(
+    "files", nargs="+", help="markdown files, directories, or glob patterns"
+)
+
+migrate_parser = subparsers.add_parser(Action.migrate)
+migrate_parser.add_argument(
+    "--backfill",
+    action="store_true",
+    help="rebuild every post summary even if the schema is current",
+)
 
 publish_parser = subparsers.add_parser(Action.publish)
 publish_parser.add_argument("-u", "--unpublish", action="store_true")
+publish_parser.add_argument("file", type=Path)
 
 delete_parser = subparsers.add_parser(Action.delete)
+delete_parser.add_argument("file", type=Path)
+
+gc_parser = subparsers.add_parser(Action.gc)
+gc_parser.add_argument(
+    "--grace",
+    type=float,
+    default=3600,
+    help="seconds an image must stay unlinked before it is deleted",
+)
+gc_parser.add_argument(
+    "-n", "--dry-run", action="store_true", help="only report what would be deleted"
+)
+
+
+def main(argv=None) -> None:
+    args = parser.parse_args(argv)
+    load(args.action).run(args, parser)
+
 
-parser.add_argument("file", type=Path)
-args = parser.parse_args()
-
-if args.action == Action.create:
-    with open(args.file, "x") as f:
-        f.write(create_post(args.title))
-else:
-    with MongoClient(settings.mongodb_uri) as client, GridFsUploader(
-        client.blog
-    ) as image_client:
-        db = client.blog
-
-        if args.action == Action.upload:
-            md_path = Path(args.file)
-
-            def _uploader(key, value, format, meta):
-                if key == "Image":
-                    with open(md_path.parent / value[2][0], "rb") as g:
-                        url = image_client.upload(g)
-
-                    return Image(*value[:2], [url, ""])
-
-            pandoc_filters: list[Callable] = [_uploader, Embedder()]
-
-            post = markdown_to_doc(
-                args.file,
-                pandoc_filters=pandoc_filters,
-            )
-
-            post.published = args.publish
-            db.posts.replace_one(
-                {"_id": post.id},
-                post.dict(by_alias=True, exclude_none=True),
-                upsert=True,
-            )
-        elif args.action == Action.publish:
-            post = markdown_to_doc(args.file)
-            db.posts.update_one(
-                {"_id": post.id}, {"$set": {"published": not args.unpublish}}
-            )
-        elif args.action == Action.delete:
-            post = markdown_to_doc(args.file)
-            mpath = Path(args.file)
-            doc = markdown_to_ast(args.file)
-
-            def _delete_image(key, value, format, meta):
-                if key == "Image":
-                    image_client.remove(mpath.parent / value[2][0])
-
-            doc = walk(doc, _delete_image, "", doc["meta"])
-
-            db.posts.delete_one({"_id": post.id})
+if __name__ == "__main__":
+    main()
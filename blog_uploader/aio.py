@@ -0,0 +1,244 @@
+import asyncio
+import inspect
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional, Sequence
+
+import orjson
+from pendulum.tz.timezone import Timezone
+from pymongo import AsyncMongoClient
+
+from blog_uploader import profiling
+from blog_uploader.batch import (
+    UploadReport,
+    UploadResult,
+    UploadStatus,
+    conversion_result,
+    conversion_settings,
+    image_writes,
+    post_writes,
+    record_manifests,
+    summary_writes,
+)
+from blog_uploader.document import (
+    LOCAL_TZ,
+    build_post,
+    markdown_to_doc,
+    parse_metadata,
+    source_body,
+    split_title,
+)
+from blog_uploader.embedders import Embedder
+from blog_uploader.exceptions import PostException
+from blog_uploader.image_uploaders import ImageUploader
+from blog_uploader.image_uploaders.optimizer import ImageOptimizer
+from blog_uploader.image_uploaders.stage import ImageStage
+from blog_uploader.manifest import ManifestSet, file_state, is_current, read_source
+from blog_uploader.pipeline import FilterPipeline
+from blog_uploader.schemas import Post
+
+__all__ = ["AsyncMongoClient", "AsyncPandoc", "convert_post", "upload_posts"]
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncPandoc:
+    def __init__(self, executable: str = "pandoc", max_processes: Optional[int] = None):
+        self.executable = executable
+        self._slots = asyncio.Semaphore(max_processes or os.cpu_count() or 1)
+
+    async def convert(
+        self,
+        source: bytes,
+        from_format: str,
+        to_format: str,
+        *,
+        highlight: bool = True,
+    ) -> bytes:
+        args = [self.executable, "-f", from_format, "-t", to_format]
+        if not highlight:
+            args.insert(1, "--no-highlight")
+
+        async with self._slots:
+            p = await asyncio.create_subprocess_exec(
+                *args,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            output, error = await p.communicate(source)
+
+        if p.returncode != 0:
+            raise PostException(error)
+        return output
+
+
+async def convert_post(
+    file: Path,
+    pandoc: AsyncPandoc,
+    pipeline: FilterPipeline,
+    *,
+    timezone: Timezone = LOCAL_TZ,
+    low_memory: bool = False,
+    source: Optional[bytes] = None,
+) -> Post:
+    if low_memory:
+        return await asyncio.to_thread(
+            markdown_to_doc,
+            file,
+            timezone=timezone,
+            pandoc_filters=pipeline,
+            low_memory=True,
+        )
+
+    if source is None:
+        source = await asyncio.to_thread(file.read_bytes)
+    profiling.count("pandoc.bytes", len(source))
+    with profiling.span("markdown_to_ast"):
+        ast = await pandoc.convert(source, "gfm", "json", highlight=False)
+    meta, title, doc = split_title(orjson.loads(ast))
+    metadata = parse_metadata(meta)
+
+    # filters talk to image hosts and Bionic through blocking clients
+    await asyncio.to_thread(pipeline, doc, meta=meta)
+
+    body = None
+    if not pipeline.modified:
+        body = source_body(source)
+    if body is None:
+        with profiling.span("doc_to_markdown"):
+            body = (await pandoc.convert(orjson.dumps(doc), "json", "gfm")).decode()
+
+    return await asyncio.to_thread(
+        build_post, file, title, body, metadata, timezone=timezone
+    )
+
+
+async def _convert(
+    path: Path,
+    pandoc: AsyncPandoc,
+    image_client: ImageUploader,
+    image_executor: ThreadPoolExecutor,
+    embedder: Embedder,
+    pandoc_filters: Sequence[Callable],
+    manifests: Optional[ManifestSet],
+    publish: bool,
+    low_memory: bool,
+    optimizer: Optional[ImageOptimizer],
+) -> UploadResult:
+    start = time.perf_counter()
+    try:
+        if manifests is not None and await asyncio.to_thread(
+            manifests[path].is_fresh, path, publish
+        ):
+            return UploadResult(
+                path, time.perf_counter() - start, status=UploadStatus.unchanged
+            )
+
+        image_stage = ImageStage(
+            image_client, path.parent, executor=image_executor, optimizer=optimizer
+        )
+        pipeline = FilterPipeline([image_stage, embedder, *pandoc_filters])
+        source_state: Optional[list]
+        if low_memory:
+            source_state = await asyncio.to_thread(file_state, path)
+            post = await convert_post(path, pandoc, pipeline, low_memory=True)
+            if not is_current(path, source_state):
+                source_state = None
+        else:
+            source, source_state = await asyncio.to_thread(read_source, path)
+            post = await convert_post(path, pandoc, pipeline, source=source)
+        return conversion_result(
+            path, start, post, image_stage, pipeline, manifests, publish, source_state
+        )
+    except Exception as e:
+        # whatever breaks one post, the others are still written
+        if not isinstance(e, (PostException, OSError, ValueError)):
+            logger.warning("converting %s failed", path, exc_info=True)
+        return UploadResult(
+            path, time.perf_counter() - start, status=UploadStatus.failed, error=e
+        )
+
+
+async def _bulk_write(collection: Any, ops: list) -> Any:
+    if inspect.iscoroutinefunction(collection.bulk_write):
+        return await collection.bulk_write(ops, ordered=False)
+    return await asyncio.to_thread(collection.bulk_write, ops, ordered=False)
+
+
+async def upload_posts(
+    files: Iterable[Path],
+    db: Any,
+    image_client: ImageUploader,
+    *,
+    publish: bool = False,
+    max_workers: Optional[int] = None,
+    image_workers: int = 8,
+    pandoc_workers: Optional[int] = None,
+    pandoc_filters: Sequence[Callable] = (),
+    use_manifest: bool = True,
+    low_memory: bool = False,
+    image_optimizer: Optional[ImageOptimizer] = None,
+    executable: str = "pandoc",
+    on_result: Optional[Callable[[UploadResult], None]] = None,
+) -> UploadReport:
+    report = UploadReport()
+    embedder = Embedder()
+    manifests = ManifestSet(
+        conversion_settings(
+            pandoc_filters, low_memory=low_memory, optimizer=image_optimizer
+        )
+    )
+    pandoc = AsyncPandoc(executable, pandoc_workers)
+    in_flight = asyncio.Semaphore(max_workers or 64)
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=image_workers) as image_executor:
+
+        async def convert(path: Path) -> UploadResult:
+            async with in_flight:
+                with profiling.profile(str(path)) as prof:
+                    result = await _convert(
+                        path,
+                        pandoc,
+                        image_client,
+                        image_executor,
+                        embedder,
+                        pandoc_filters,
+                        manifests if use_manifest else None,
+                        publish,
+                        low_memory,
+                        image_optimizer,
+                    )
+                if prof is not None:
+                    result.profile = prof.to_dict()
+                return result
+
+        for task in asyncio.as_completed([convert(path) for path in files]):
+            result = await task
+            report.results.append(result)
+            if on_result is not None:
+                on_result(result)
+
+    with profiling.profile("write") as prof:
+        ops = post_writes(report)
+        if ops:
+            with profiling.span("mongo.bulk_write"):
+                res, *_ = await asyncio.gather(
+                    _bulk_write(db.posts, ops),
+                    _bulk_write(db.post_summaries, summary_writes(report)),
+                    _bulk_write(db.images, image_writes(report)),
+                )
+            profiling.count("mongo.documents", len(ops))
+            report.written = res.upserted_count + res.modified_count
+
+        with profiling.span("manifest.save"):
+            await asyncio.to_thread(record_manifests, manifests, report, publish)
+    if prof is not None:
+        report.profile = prof.to_dict()
+
+    report.elapsed = time.perf_counter() - start
+    return report
@@ -0,0 +1,329 @@
+import glob
+import logging
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Sequence, Union
+
+from pymongo import ReplaceOne, UpdateMany
+from pymongo.database import Database
+
+from blog_uploader import profiling
+from blog_uploader.document import markdown_to_doc
+from blog_uploader.embedders import Embedder
+from blog_uploader.exceptions import PostException
+from blog_uploader.image_uploaders import ImageUploader
+from blog_uploader.image_uploaders.optimizer import ImageOptimizer
+from blog_uploader.image_uploaders.registry import reference_writes
+from blog_uploader.image_uploaders.stage import ImageStage
+from blog_uploader.manifest import (
+    ManifestSet,
+    file_state,
+    is_current,
+    post_hash,
+    read_source,
+    settings_digest,
+)
+from blog_uploader.pipeline import FilterPipeline, filter_settings
+from blog_uploader.schemas import Post
+
+__all__ = [
+    "collect_files",
+    "upload_posts",
+    "UploadResult",
+    "UploadReport",
+    "UploadStatus",
+]
+
+logger = logging.getLogger(__name__)
+
+MARKDOWN_SUFFIXES = (".md", ".markdown")
+
+
+def collect_files(patterns: Iterable[Union[str, Path]]) -> list[Path]:
+    files: dict[Path, None] = {}
+
+    for pattern in map(str, patterns):
+        paths = [Path(p) for p in glob.glob(pattern, recursive=True)] or [Path(pattern)]
+        for path in paths:
+            if path.is_dir():
+                for suffix in MARKDOWN_SUFFIXES:
+                    files.update(dict.fromkeys(sorted(path.rglob(f"*{suffix}"))))
+            else:
+                files[path] = None
+
+    return list(files)
+
+
+class UploadStatus(str, Enum):
+    uploaded = "uploaded"
+    unchanged = "unchanged"
+    identical = "identical"
+    failed = "failed"
+
+    def __str__(self):
+        return self.value
+
+
+@dataclass
+class UploadResult:
+    path: Path
+    elapsed: float
+    status: UploadStatus = UploadStatus.uploaded
+    post: Optional[Post] = None
+    post_hash: Optional[str] = None
+    images: list[str] = field(default_factory=list)
+    image_urls: list[str] = field(default_factory=list)
+    source_state: Optional[list] = None
+    image_states: dict[str, list] = field(default_factory=dict)
+    timings: dict[str, float] = field(default_factory=dict)
+    warnings: list[str] = field(default_factory=list)
+    error: Optional[Exception] = None
+    profile: Optional[dict] = None
+
+
+@dataclass
+class UploadReport:
+    results: list[UploadResult] = field(default_factory=list)
+    elapsed: float = 0.0
+    written: int = 0
+    profile: Optional[dict] = None
+
+    def with_status(self, status: UploadStatus) -> list[UploadResult]:
+        return [r for r in self.results if r.status == status]
+
+    @property
+    def uploaded(self) -> list[tuple[UploadResult, Post]]:
+        return [
+            (r, r.post)
+            for r in self.with_status(UploadStatus.uploaded)
+            if r.post is not None
+        ]
+
+    @property
+    def failed(self) -> list[UploadResult]:
+        return self.with_status(UploadStatus.failed)
+
+    @property
+    def warned(self) -> list[UploadResult]:
+        return [r for r in self.results if r.warnings]
+
+    @property
+    def throughput(self) -> float:
+        return len(self.results) / self.elapsed if self.elapsed else 0.0
+
+
+def conversion_result(
+    path: Path,
+    start: float,
+    post: Post,
+    image_stage: ImageStage,
+    pipeline: FilterPipeline,
+    manifests: Optional[ManifestSet],
+    publish: bool,
+    source_state: Optional[list],
+) -> UploadResult:
+    post.published = publish
+    digest = post_hash(post)
+
+    for name, seconds, calls in zip(pipeline.names, pipeline.timings, pipeline.calls):
+        profiling.record(f"filter.{name}", seconds, calls)
+
+    status = UploadStatus.uploaded
+    if manifests is not None and manifests[path].post_unchanged(path, digest):
+        status = UploadStatus.identical
+
+    return UploadResult(
+        path,
+        time.perf_counter() - start,
+        status=status,
+        post=post,
+        post_hash=digest,
+        images=image_stage.images,
+        image_urls=image_stage.image_urls,
+        source_state=source_state,
+        image_states=image_stage.states,
+        timings=pipeline.report(),
+        warnings=pipeline.warnings,
+    )
+
+
+def _convert_profiled(path: Path, *args) -> UploadResult:
+    with profiling.profile(str(path)) as prof:
+        result = _convert(path, *args)
+    if prof is not None:
+        result.profile = prof.to_dict()
+    return result
+
+
+def _convert(
+    path: Path,
+    image_client: ImageUploader,
+    image_executor: Executor,
+    embedder: Embedder,
+    pandoc_filters: Sequence[Callable],
+    manifests: Optional[ManifestSet],
+    publish: bool,
+    low_memory: bool,
+    optimizer: Optional[ImageOptimizer],
+) -> UploadResult:
+    start = time.perf_counter()
+    try:
+        if manifests is not None and manifests[path].is_fresh(path, publish):
+            return UploadResult(
+                path, time.perf_counter() - start, status=UploadStatus.unchanged
+            )
+
+        image_stage = ImageStage(
+            image_client, path.parent, executor=image_executor, optimizer=optimizer
+        )
+        pipeline = FilterPipeline([image_stage, embedder, *pandoc_filters])
+        source_state: Optional[list]
+        if low_memory:
+            source_state = file_state(path)
+            post = markdown_to_doc(path, pandoc_filters=pipeline, low_memory=True)
+            if not is_current(path, source_state):
+                # pandoc read the file itself, so which save it saw is unknown
+                source_state = None
+        else:
+            source, source_state = read_source(path)
+            post = markdown_to_doc(path, pandoc_filters=pipeline, source=source)
+        return conversion_result(
+            path, start, post, image_stage, pipeline, manifests, publish, source_state
+        )
+    except Exception as e:
+        # whatever breaks one post, the others are still written
+        if not isinstance(e, (PostException, OSError, ValueError)):
+            logger.warning("converting %s failed", path, exc_info=True)
+        return UploadResult(
+            path, time.perf_counter() - start, status=UploadStatus.failed, error=e
+        )
+
+
+def post_writes(report: UploadReport) -> list[ReplaceOne]:
+    return [
+        ReplaceOne(
+            {"_id": post.id},
+            post.dict(by_alias=True, exclude_none=True),
+            upsert=True,
+        )
+        for _, post in report.uploaded
+    ]
+
+
+def summary_writes(report: UploadReport) -> list[ReplaceOne]:
+    return [
+        ReplaceOne(
+            {"_id": post.id},
+            post.to_summary().dict(by_alias=True, exclude_none=True),
+            upsert=True,
+        )
+        for _, post in report.uploaded
+    ]
+
+
+def image_writes(report: UploadReport) -> list[UpdateMany]:
+    return [
+        op
+        for result, post in report.uploaded
+        for op in reference_writes(post.id, result.image_urls)
+    ]
+
+
+def conversion_settings(
+    pandoc_filters: Sequence[Callable],
+    *,
+    low_memory: bool = False,
+    optimizer: Optional[ImageOptimizer] = None,
+) -> str:
+    # the streamed render always goes through pandoc, so its body can differ
+    return settings_digest(
+        {
+            "filters": filter_settings(pandoc_filters),
+            "low_memory": low_memory,
+            "images": None if optimizer is None else optimizer.settings,
+        }
+    )
+
+
+def record_manifests(
+    manifests: ManifestSet, report: UploadReport, publish: bool
+) -> None:
+    for result in report.results:
+        if result.post_hash is not None and result.source_state is not None:
+            manifests[result.path].record(
+                result.path,
+                result.post_hash,
+                publish,
+                result.source_state,
+                result.image_states,
+            )
+    manifests.save()
+
+
+def upload_posts(
+    files: Iterable[Path],
+    db: Database,
+    image_client: ImageUploader,
+    *,
+    publish: bool = False,
+    max_workers: Optional[int] = None,
+    image_workers: int = 8,
+    pandoc_filters: Sequence[Callable] = (),
+    use_manifest: bool = True,
+    low_memory: bool = False,
+    image_optimizer: Optional[ImageOptimizer] = None,
+    on_result: Optional[Callable[[UploadResult], None]] = None,
+) -> UploadReport:
+    report = UploadReport()
+    embedder = Embedder()
+    manifests = ManifestSet(
+        conversion_settings(
+            pandoc_filters, low_memory=low_memory, optimizer=image_optimizer
+        )
+    )
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor, ThreadPoolExecutor(
+        max_workers=image_workers
+    ) as image_executor:
+        futures = [
+            executor.submit(
+                _convert_profiled,
+                path,
+                image_client,
+                image_executor,
+                embedder,
+                pandoc_filters,
+                manifests if use_manifest else None,
+                publish,
+                low_memory,
+                image_optimizer,
+            )
+            for path in files
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            report.results.append(result)
+            if on_result is not None:
+                on_result(result)
+
+    with profiling.profile("write") as prof:
+        ops = post_writes(report)
+        if ops:
+            with profiling.span("mongo.bulk_write"):
+                res = db.posts.bulk_write(ops, ordered=False)
+                db.post_summaries.bulk_write(summary_writes(report), ordered=False)
+                db.images.bulk_write(image_writes(report), ordered=False)
+            profiling.count("mongo.documents", len(ops))
+            report.written = res.upserted_count + res.modified_count
+
+        with profiling.span("manifest.save"):
+            record_manifests(manifests, report, publish)
+    if prof is not None:
+        report.profile = prof.to_dict()
+
+    report.elapsed = time.perf_counter() - start
+    return report
@@ -1,69 +1,261 @@
 import abc
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from itertools import groupby
+from typing import Iterator, Optional
 from urllib.parse import quote, urlencode
 
 import lxml.html as html
 import requests
+from lxml import etree
 from pandocfilters import Para, RawBlock, RawInline, stringify
 
+from blog_uploader import profiling
+from blog_uploader.bionic.cache import ConversionCache
+from blog_uploader.bionic.ratelimit import TokenBucket
+from blog_uploader.pipeline import warn
+
+logger = logging.getLogger(__name__)
+
+CONTAINER_CLASS = "bionic-reader-container"
+
 
 class BionicException(Exception):
     pass
 
 
+def clean_html(content: bytes) -> str:
+    try:
+        tree = html.fragment_fromstring(content)
+    except etree.ParserError as err:
+        raise BionicException(f"unparseable response: {err}") from err
+
+    root = None
+    comments = []
+    for e in tree.iter():
+        if e.tag is etree.Comment:
+            comments.append(e)
+            continue
+        e.attrib.pop("style", None)
+        if root is None and e.tag == "div" and CONTAINER_CLASS in e.get("class", ""):
+            root = e
+
+    if root is None:
+        raise BionicException("no bionic-reader-container in response")
+
+    for c in comments:
+        c.getparent().remove(c)
+
+    text, tail = root.text or "", root.tail or ""
+    root.text = root.tail = None
+    root.attrib.clear()
+    # serialise the children in one call by stripping the now bare <div></div>
+    inner = html.tostring(root, encoding="unicode")[len("<div>") : -len("</div>")]
+
+    return text.lstrip() + inner + tail.rstrip()
+
+
 class BionicBase(abc.ABC):
+    node_types = {"Plain", "Para"}
+    fixation = "1"
+    saccade = "10"
+    cache: Optional[ConversionCache] = None
+    rate_limiter: Optional[TokenBucket] = None
+    max_workers = 4
+    max_retries = 5
+    backoff = 0.5
+    # texts remembered between prepare() and the walk, bounded so a long watch
+    # session keeps those of the posts it saw last rather than all of them
+    memo_size = 4096
+
+    @property
+    def settings(self) -> dict:
+        return {
+            "filter": type(self).__name__,
+            "fixation": self.fixation,
+            "saccade": self.saccade,
+        }
+
     @abc.abstractmethod
     def convert(self, value: str) -> requests.Response:
         ...
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # filled by prepare() and read back by __call__ during the following walk
+        self._converted: OrderedDict[str, str] = OrderedDict()
+        # texts prepare() gave up on, which __call__ leaves as they are instead
+        # of going through the retries again one paragraph at a time
+        self._failed: OrderedDict[str, str] = OrderedDict()
+        self._memo_lock = threading.Lock()
+
+    def _remember(self, memo: OrderedDict[str, str], text: str, value: str) -> None:
+        with self._memo_lock:
+            memo[text] = value
+            memo.move_to_end(text)
+            while len(memo) > self.memo_size:
+                memo.popitem(last=False)
+
+    def _convert_with_retry(self, value: str) -> requests.Response:
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+
+            retry_after = 0.0
+            try:
+                profiling.count("bionic.requests")
+                with profiling.span("bionic.convert"):
+                    resp = self.convert(value)
+            except requests.ConnectionError as e:
+                logger.debug("bionic request failed: %s", e)
+            else:
+                profiling.count("bionic.bytes", len(resp.content))
+                if resp.status_code != 429:
+                    return resp
+
+                profiling.count("bionic.rate_limited")
+                try:
+                    retry_after = float(resp.headers.get("Retry-After") or 0)
+                except ValueError:
+                    pass
+                if self.rate_limiter is not None and retry_after:
+                    self.rate_limiter.penalize(retry_after)
+
+            if attempt < self.max_retries:
+                time.sleep(
+                    max(
+                        retry_after,
+                        self.backoff * 2**attempt * random.uniform(1, 1.5),
+                    )
+                )
+
+        raise BionicException("rate limited")
+
     def process_str(self, value):
-        resp = self.convert(value)
-
-        if resp.status_code == 429:
-            raise BionicException("rate limited")
-
-        tree = html.fragment_fromstring(resp.content)
-        for c in tree.xpath("//comment()"):
-            c.getparent().remove(c)
-        for s in tree.xpath("//*[@style]"):
-            del s.attrib["style"]
-
-        (root,) = tree.xpath('//div[contains(@class, "bionic-reader-container")]')
-        return (
-            root.text.lstrip()
-            + "".join(html.tostring(e, encoding="unicode") for e in root.iterchildren())
-            + root.tail.rstrip()
-        )
+        converted = self._converted.get(value)
+        if converted is not None:
+            profiling.count("bionic.memo_hits")
+            return converted
+
+        if self.cache is None:
+            return self._process_str(value)
+
+        key = self.cache.key(value, type(self).__name__, self.fixation, self.saccade)
+        result = self.cache.get(key)
+        if result is None:
+            profiling.count("bionic.cache_misses")
+            result = self._process_str(value)
+            self.cache.set(key, result)
+        else:
+            profiling.count("bionic.cache_hits")
+        return result
+
+    def _process_str(self, value):
+        resp = self._convert_with_retry(value)
+        if not resp.ok:
+            raise BionicException(f"{resp.status_code} {resp.reason}")
+
+        return clean_html(resp.content)
+
+    @staticmethod
+    def _runs(value: list) -> Iterator[tuple[bool, list]]:
+        for is_str, group in groupby(
+            value, key=lambda v: v["t"] in ("Str", "Space", "SoftBreak")
+        ):
+            yield is_str, list(group)
+
+    def _texts(self, doc: dict) -> Iterator[str]:
+        stack: list = [doc["blocks"]]
+        while stack:
+            x = stack.pop()
+            if isinstance(x, list):
+                stack.extend(x)
+            elif isinstance(x, dict):
+                match x:
+                    case {"t": "Plain", "c": value}:
+                        yield stringify(value)
+                    case {"t": "Para", "c": value}:
+                        for is_str, lg in self._runs(value):
+                            if is_str:
+                                if lg[0]["t"] == "Space":
+                                    lg.pop(0)
+                                yield stringify(lg)
+                            else:
+                                stack.extend(lg)
+                    case _:
+                        stack.extend(x.values())
+
+    def prepare(self, doc: dict):
+        texts = []
+        with self._memo_lock:
+            for text in dict.fromkeys(self._texts(doc)):
+                if text in self._converted:
+                    self._converted.move_to_end(text)
+                else:
+                    texts.append(text)
+        if not texts:
+            return
+
+        def _process(text):
+            try:
+                return text, self.process_str(text), None
+            except BionicException as e:
+                logger.warning("bionic conversion failed for %.40r: %s", text, e)
+                return text, None, str(e)
+
+        with ThreadPoolExecutor(min(self.max_workers, len(texts))) as executor:
+            for text, result, error in executor.map(profiling.bind(_process), texts):
+                if result is None:
+                    self._remember(self._failed, text, error)
+                else:
+                    self._remember(self._converted, text, result)
+                    with self._memo_lock:
+                        self._failed.pop(text, None)
+
+    def _convert_text(self, text: str) -> Optional[str]:
+        error = self._failed.get(text)
+        if error is None:
+            try:
+                return self.process_str(text)
+            except BionicException as e:
+                error = str(e)
+                self._remember(self._failed, text, error)
+        warn(f"{type(self).__name__} left {text[:40]!r} unconverted: {error}")
+        return None
 
     def __call__(self, key, value, format, meta):
-        try:
-            match key:
-                case "Plain":
-                    return RawBlock("html", self.process_str(stringify(value)))
-                case "Para":
-                    result = []
-
-                    for is_str, group in groupby(
-                        value, key=lambda v: v["t"] in ("Str", "Space", "SoftBreak")
-                    ):
-                        if is_str:
-                            lg = list(group)
-                            if lg[0]["t"] == "Space":
-                                result.append(lg.pop(0))
-                            result.append(
-                                RawInline("html", self.process_str(stringify(lg)))
-                            )
+        match key:
+            case "Plain":
+                converted = self._convert_text(stringify(value))
+                if converted is not None:
+                    return RawBlock("html", converted)
+            case "Para":
+                result = []
+
+                # a run that failed keeps its inlines, the others still convert
+                for is_str, lg in self._runs(value):
+                    if is_str:
+                        if lg[0]["t"] == "Space":
+                            result.append(lg.pop(0))
+                        converted = self._convert_text(stringify(lg))
+                        if converted is None:
+                            result.extend(lg)
                         else:
-                            result.extend(group)
+                            result.append(RawInline("html", converted))
+                    else:
+                        result.extend(lg)
 
-                    return Para(result)
-        except BionicException:
-            pass
+                return Para(result)
 
 
 class Bionic(BionicBase, requests.Session):
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, *, cache: Optional[ConversionCache] = None):
         super().__init__()
+        self.cache = cache
         self.headers.update(
             {
                 "Content-Type": "application/x-www-form-urlencoded",
@@ -80,8 +272,8 @@ class Bionic(BionicBase, requests.Session):
                     "content": value,
                     "response_type": "html",
                     "request_type": "html",
-                    "fixation": "1",
-                    "saccade": "10",
+                    "fixation": self.fixation,
+                    "saccade": self.saccade,
                 },
                 quote_via=quote,
             ),
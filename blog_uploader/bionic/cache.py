@@ -0,0 +1,92 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Union
+
+from blog_uploader.settings import cache_dir
+
+__all__ = ["ConversionCache", "default_cache_path"]
+
+
+def default_cache_path() -> Path:
+    return cache_dir() / "bionic.sqlite3"
+
+
+class ConversionCache:
+    EVICT_EVERY = 256
+
+    def __init__(
+        self,
+        path: Union[str, Path, None] = None,
+        *,
+        max_entries: int = 100_000,
+    ):
+        self.path = Path(path) if path is not None else default_cache_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._inserts = 0
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversions "
+            "(key TEXT PRIMARY KEY, html TEXT NOT NULL, used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS conversions_used ON conversions (used)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def key(value: str, *params: str) -> str:
+        h = hashlib.sha256()
+        for part in (*params, value):
+            h.update(part.encode())
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT html FROM conversions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE conversions SET used = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            return row[0]
+
+    def set(self, key: str, html: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO conversions (key, html, used) VALUES (?, ?, ?)",
+                (key, html, time.time()),
+            )
+            self._inserts += 1
+            if self._inserts % self.EVICT_EVERY == 0:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        self._conn.execute(
+            "DELETE FROM conversions WHERE key IN ("
+            "SELECT key FROM conversions ORDER BY used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._evict()
+            self._conn.commit()
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -1,18 +1,24 @@
 import secrets
+from typing import Optional
 
 import requests
 
 import blog_uploader.bionic
+from blog_uploader.bionic.cache import ConversionCache
 
 
 class Bionic(blog_uploader.bionic.BionicBase, requests.Session):
+    fixation = "2"
+    saccade = "20"
+
     @staticmethod
     def get_rand_hex(n: int) -> str:
         return secrets.token_bytes(n).hex()
 
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, *, cache: Optional[ConversionCache] = None):
         super().__init__()
 
+        self.cache = cache
         self.api_key = api_key
         self.bionic_client_id = "-".join(map(self.get_rand_hex, [4, 2, 2, 2, 6]))
 
@@ -45,7 +51,7 @@ class Bionic(blog_uploader.bionic.BionicBase, requests.Session):
                 "content": value,
                 "request_type": "html",
                 "response_type": "html",
-                "saccade": "20",
-                "fixation": "2",
+                "saccade": self.saccade,
+                "fixation": self.fixation,
             },
         )
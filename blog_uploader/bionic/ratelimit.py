@@ -0,0 +1,38 @@
+import threading
+import time
+
+__all__ = ["TokenBucket"]
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = 1.0):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if capacity < 1:
+            # a bucket that can never hold a whole token never lets anyone through
+            raise ValueError("capacity must be at least one token")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def penalize(self, seconds: float) -> None:
+        # drain the bucket so every caller backs off after a 429
+        with self._lock:
+            self._tokens = min(self._tokens, -seconds * self.rate)
+            self._updated = time.monotonic()
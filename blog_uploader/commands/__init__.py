@@ -0,0 +1,24 @@
+import importlib
+from enum import Enum
+from types import ModuleType
+
+__all__ = ["Action", "load"]
+
+
+class Action(str, Enum):
+    create = "create"
+    upload = "upload"
+    publish = "publish"
+    delete = "delete"
+    watch = "watch"
+    export = "export"
+    migrate = "migrate"
+    gc = "gc"
+
+    def __str__(self):
+        return self.value
+
+
+def load(action: Action) -> ModuleType:
+    # each action imports only its own dependencies
+    return importlib.import_module(f"{__name__}.{action}")
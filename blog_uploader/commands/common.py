@@ -0,0 +1,71 @@
+import argparse
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from pymongo.database import Database
+
+from blog_uploader.image_uploaders.optimizer import ImageOptimizer
+from blog_uploader.image_uploaders.registry import ImageRegistry
+from blog_uploader.settings import get_settings
+
+__all__ = ["connect", "image_optimizer", "pandoc_filters"]
+
+
+@contextmanager
+def connect() -> Iterator[tuple[Database, ImageRegistry]]:
+    from pymongo import MongoClient
+
+    from blog_uploader.image_uploaders.gridfs_uploader import GridFsUploader
+    from blog_uploader.migrations import migrate
+
+    client: MongoClient[dict] = MongoClient(get_settings().mongodb_uri)
+    with client, ImageRegistry(
+        client.blog, GridFsUploader(client.blog)
+    ) as image_client:
+        migrate(client.blog)
+        yield client.blog, image_client
+
+
+@contextmanager
+def pandoc_filters(
+    args: argparse.Namespace, parser: argparse.ArgumentParser
+) -> Iterator[list[Callable]]:
+    if not args.bionic:
+        yield []
+        return
+
+    from blog_uploader.bionic.cache import ConversionCache
+    from blog_uploader.bionic.public import Bionic
+    from blog_uploader.bionic.ratelimit import TokenBucket
+
+    settings = get_settings()
+    if settings.bionic_public_api_key is None:
+        parser.error("BIONIC_PUBLIC_API_KEY is not set")
+
+    with ConversionCache() as cache, Bionic(
+        settings.bionic_public_api_key.get_secret_value(), cache=cache
+    ) as bionic:
+        bionic.rate_limiter = TokenBucket(args.bionic_rate, max(1.0, args.bionic_rate))
+        yield [bionic]
+
+
+@contextmanager
+def image_optimizer(
+    args: argparse.Namespace, parser: argparse.ArgumentParser
+) -> Iterator[Optional[ImageOptimizer]]:
+    if not args.optimize_images:
+        yield None
+        return
+
+    try:
+        from PIL import features
+    except ImportError:
+        parser.error("--optimize-images needs Pillow, from the images extra")
+    for fmt in args.image_formats:
+        if fmt in ("avif", "webp") and not features.check(fmt):
+            parser.error(f"this Pillow build cannot write {fmt}")
+
+    with ImageOptimizer(
+        widths=args.image_widths, formats=args.image_formats
+    ) as optimizer:
+        yield optimizer
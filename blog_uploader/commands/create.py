@@ -0,0 +1,8 @@
+import argparse
+
+from blog_uploader.create_post import create_post
+
+
+def run(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
+    with open(args.file, "x") as f:
+        f.write(create_post(args.title))
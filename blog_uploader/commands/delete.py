@@ -0,0 +1,18 @@
+import argparse
+
+from blog_uploader.commands.common import connect
+from blog_uploader.document import read_metadata
+from blog_uploader.manifest import Manifest
+
+
+def run(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
+    metadata = read_metadata(args.file)
+    with connect() as (db, images):
+        db.posts.delete_one({"_id": metadata.id})
+        db.post_summaries.delete_one({"_id": metadata.id})
+        # other posts may share the images, so gc removes them once unlinked
+        images.release(metadata.id)
+
+    manifest = Manifest(args.file.parent.resolve())
+    manifest.discard(args.file)
+    manifest.save()
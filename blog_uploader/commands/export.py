@@ -0,0 +1,33 @@
+import argparse
+
+from blog_uploader.batch import collect_files
+from blog_uploader.commands.common import image_optimizer
+from blog_uploader.export import export_posts
+from blog_uploader.pandoc import create_backend, use_backend
+
+
+def run(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
+    files = collect_files(args.files)
+    with image_optimizer(args, parser) as optimizer, use_backend(
+        create_backend(min(args.pandoc_workers, len(files)))
+    ):
+        report = export_posts(
+            files,
+            args.output,
+            max_workers=args.jobs,
+            page_size=args.page_size,
+            base_url=args.base_url,
+            image_optimizer=optimizer,
+            force=args.force,
+            publish=args.publish,
+        )
+
+    for path, error in report.failed:
+        print(f"{path}: failed ({error!r})")
+    print(
+        f"{len(report.written)} written, {report.unchanged} unchanged, "
+        f"{report.drafts} drafts skipped, {report.removed} removed, {len(report.failed)} failed "
+        f"in {report.elapsed:.3f}s"
+    )
+    if report.failed:
+        parser.exit(1)
@@ -0,0 +1,17 @@
+import argparse
+import datetime
+
+from blog_uploader.commands.common import connect
+
+
+def run(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
+    with connect() as (_, images):
+        report = images.collect(
+            grace=datetime.timedelta(seconds=args.grace), dry_run=args.dry_run
+        )
+
+    print(
+        f"{'would remove' if args.dry_run else 'removed'} {report.removed} images "
+        f"({report.bytes / 1024 / 1024:.1f} MiB)"
+        + (f", {report.kept} linked again meanwhile" if report.kept else "")
+    )
@@ -0,0 +1,13 @@
+import argparse
+
+from blog_uploader.commands.common import connect
+from blog_uploader.migrations import MIGRATIONS, backfill_summaries
+
+
+def run(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
+    # connecting applies any pending migrations
+    with connect() as (db, _):
+        if args.backfill:
+            backfill_summaries(db)
+
+    print(f"schema at version {len(MIGRATIONS)}")
@@ -0,0 +1,19 @@
+import argparse
+
+from blog_uploader.commands.common import connect
+from blog_uploader.document import read_metadata
+from blog_uploader.manifest import Manifest
+
+
+def run(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
+    metadata = read_metadata(args.file)
+    with connect() as (db, _):
+        for collection in (db.posts, db.post_summaries):
+            collection.update_one(
+                {"_id": metadata.id}, {"$set": {"published": not args.unpublish}}
+            )
+
+    # the entry's published flag and post digest no longer match the database
+    manifest = Manifest(args.file.parent.resolve())
+    manifest.discard(args.file)
+    manifest.save()
@@ -0,0 +1,141 @@
+import argparse
+import asyncio
+import sys
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Callable, Optional, TextIO
+
+import orjson
+
+from blog_uploader import profiling
+from blog_uploader.batch import (
+    UploadReport,
+    UploadResult,
+    UploadStatus,
+    collect_files,
+    upload_posts,
+)
+from blog_uploader.commands.common import connect, image_optimizer, pandoc_filters
+from blog_uploader.image_uploaders import ImageUploader
+from blog_uploader.image_uploaders.optimizer import ImageOptimizer
+from blog_uploader.pandoc import create_backend, use_backend
+from blog_uploader.settings import get_settings
+
+
+def print_result(result: UploadResult, file: Optional[TextIO] = None):
+    if result.error is None:
+        timings = ", ".join(f"{k} {v:.3f}s" for k, v in result.timings.items())
+        print(
+            f"{result.path}: {result.status} in {result.elapsed:.3f}s"
+            + (f" ({timings})" if timings else ""),
+            file=file,
+        )
+        for warning in result.warnings:
+            print(f"  {warning}", file=file)
+    else:
+        print(
+            f"{result.path}: failed after {result.elapsed:.3f}s ({result.error!r})",
+            file=file,
+        )
+
+
+def write_profile(out: TextIO, profile: Optional[dict], **fields) -> None:
+    if profile is not None:
+        out.write(orjson.dumps({**fields, **profile}, default=str).decode() + "\n")
+
+
+def human_output(args: argparse.Namespace) -> Optional[TextIO]:
+    # a profile written to stdout keeps it to JSON lines
+    return sys.stderr if args.profile is sys.stdout else None
+
+
+def result_printer(args: argparse.Namespace) -> Callable[[UploadResult], None]:
+    if args.profile is None:
+        return print_result
+
+    def on_result(result: UploadResult):
+        print_result(result, human_output(args))
+        write_profile(args.profile, result.profile, status=result.status)
+
+    return on_result
+
+
+async def _upload_async(
+    args: argparse.Namespace,
+    files: list[Path],
+    image_client: ImageUploader,
+    filters: list[Callable],
+    optimizer: Optional[ImageOptimizer],
+) -> UploadReport:
+    from blog_uploader import aio
+
+    client: aio.AsyncMongoClient[dict] = aio.AsyncMongoClient(
+        get_settings().mongodb_uri
+    )
+    async with client:
+        return await aio.upload_posts(
+            files,
+            client.blog,
+            image_client,
+            publish=args.publish,
+            max_workers=args.jobs,
+            pandoc_workers=args.pandoc_workers or None,
+            pandoc_filters=filters,
+            use_manifest=not args.force,
+            low_memory=args.low_memory,
+            image_optimizer=optimizer,
+            on_result=result_printer(args),
+        )
+
+
+def run(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
+    files = collect_files(args.files)
+    if args.profile is not None:
+        profiling.enable()
+
+    with pandoc_filters(args, parser) as filters:
+        with connect() as (db, image_client), image_optimizer(
+            args, parser
+        ) as optimizer, (
+            profiling.profile_threads(args.cprofile) if args.cprofile else nullcontext()
+        ):
+            if args.use_async:
+                report = asyncio.run(
+                    _upload_async(args, files, image_client, filters, optimizer)
+                )
+            else:
+                # no more servers than posts, so a single post does not wait on a
+                # server per core
+                with use_backend(create_backend(min(args.pandoc_workers, len(files)))):
+                    report = upload_posts(
+                        files,
+                        db,
+                        image_client,
+                        publish=args.publish,
+                        max_workers=args.jobs,
+                        pandoc_filters=filters,
+                        use_manifest=not args.force,
+                        low_memory=args.low_memory,
+                        image_optimizer=optimizer,
+                        on_result=result_printer(args),
+                    )
+
+    print(
+        f"{len(report.results)} posts "
+        f"({len(report.with_status(UploadStatus.unchanged))} unchanged, "
+        f"{len(report.failed)} failed, {len(report.warned)} with warnings, "
+        f"{report.written} written) "
+        f"in {report.elapsed:.3f}s, {report.throughput:.2f} posts/s",
+        file=human_output(args),
+    )
+    if args.profile is not None:
+        write_profile(
+            args.profile,
+            report.profile,
+            posts=len(report.results),
+            elapsed=report.elapsed,
+        )
+        if args.profile is not sys.stdout:
+            args.profile.close()
+    if report.failed:
+        parser.exit(1)
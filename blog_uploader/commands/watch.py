@@ -0,0 +1,34 @@
+import argparse
+import logging
+
+from blog_uploader.batch import upload_posts
+from blog_uploader.commands.common import connect, image_optimizer, pandoc_filters
+from blog_uploader.pandoc import create_backend, use_backend
+from blog_uploader.watch import watch
+
+
+def run(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s"
+    )
+    with pandoc_filters(args, parser) as filters:
+        # the client, image uploader and pandoc servers stay warm between saves
+        with connect() as (db, image_client), image_optimizer(
+            args, parser
+        ) as optimizer, use_backend(create_backend(args.pandoc_workers)):
+            try:
+                watch(
+                    args.directories,
+                    lambda files: upload_posts(
+                        files,
+                        db,
+                        image_client,
+                        publish=args.publish,
+                        pandoc_filters=filters,
+                        image_optimizer=optimizer,
+                    ),
+                    debounce=args.debounce,
+                    poll=args.poll,
+                )
+            except KeyboardInterrupt:
+                pass
@@ -0,0 +1,223 @@
+import logging
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+import orjson
+import pendulum
+import yaml
+from pandocfilters import stringify
+from pendulum.tz.timezone import Timezone
+
+from blog_uploader import profiling
+from blog_uploader.exceptions import PostException
+from blog_uploader.pandoc import get_backend
+from blog_uploader.pipeline import FilterPipeline
+from blog_uploader.schemas import Metadata, Post
+from blog_uploader.streaming import render_streaming
+
+__all__ = [
+    "LOCAL_TZ",
+    "build_post",
+    "doc_to_markdown",
+    "get_mtime",
+    "iter_nodes",
+    "markdown_to_ast",
+    "markdown_to_doc",
+    "parse_meta",
+    "parse_metadata",
+    "parse_token",
+    "process_doc",
+    "read_front_matter",
+    "read_metadata",
+    "source_body",
+    "source_to_ast",
+    "split_title",
+]
+
+logger = logging.getLogger(__name__)
+
+LOCAL_TZ = pendulum.timezone("America/New_York")
+
+
+FRONT_MATTER_RE = re.compile(
+    rb"\A---[ \t]*\r?\n(?P<yaml>.*?)^(?:---|\.\.\.)[ \t]*$\r?\n?", re.M | re.S
+)
+TITLE_RE = re.compile(rb"\A\s*#[ \t]+[^\n]*(?:\n|\Z)")
+
+
+class _MetaLoader(yaml.SafeLoader):
+    pass
+
+
+# pandoc reads every scalar in the front matter as a string, so only null is
+# resolved to anything else
+_MetaLoader.yaml_implicit_resolvers = {
+    first: [r for r in resolvers if r[0] == "tag:yaml.org,2002:null"]
+    for first, resolvers in yaml.SafeLoader.yaml_implicit_resolvers.items()
+}
+
+
+def source_to_ast(source: bytes) -> dict:
+    profiling.count("pandoc.bytes", len(source))
+    with profiling.span("markdown_to_ast"):
+        return orjson.loads(
+            get_backend().convert(source, "gfm", "json", highlight=False)
+        )
+
+
+def markdown_to_ast(file: Path) -> dict:
+    with open(file, "rb") as f:
+        return source_to_ast(f.read())
+
+
+def source_body(source: bytes) -> Optional[str]:
+    body = FRONT_MATTER_RE.sub(b"", source, count=1)
+    title = TITLE_RE.match(body)
+    if title is None:
+        return None
+    return body[title.end() :].lstrip(b"\r\n").decode()
+
+
+def read_front_matter(source: bytes) -> dict:
+    match = FRONT_MATTER_RE.match(source)
+    if match is None:
+        return {}
+    return yaml.load(match.group("yaml"), Loader=_MetaLoader) or {}
+
+
+def read_metadata(file: Path) -> Metadata:
+    with open(file, "rb") as f:
+        meta = read_front_matter(f.read())
+
+    if "id" not in meta:
+        raise PostException("no id")
+
+    return Metadata(**meta)
+
+
+def iter_nodes(doc: Any, node_type: str):
+    stack = [doc]
+    while stack:
+        x = stack.pop()
+        if isinstance(x, list):
+            stack.extend(reversed(x))
+        elif isinstance(x, dict):
+            if x.get("t") == node_type:
+                yield x
+            stack.extend(reversed(x.values()))
+
+
+def parse_token(obj: dict):
+    match obj:
+        case {"t": "MetaInlines" | "MetaBlocks", "c": meta_inlines}:
+            return stringify(meta_inlines)
+        case {"t": "MetaMap", "c": meta_map}:
+            return {key: parse_token(value) for key, value in meta_map.items()}
+        case {"t": "MetaList", "c": meta_list}:
+            return list(map(parse_token, meta_list))
+        case {"t": "MetaString", "c": ""}:
+            return None
+        case {"t": "MetaBool", "c": value}:
+            return value
+        case _:
+            return obj
+
+
+def parse_meta(meta: dict):
+    return {key: parse_token(value) for key, value in meta.items()}
+
+
+def split_title(doc: dict) -> tuple[dict, str, dict]:
+    meta = doc["meta"]
+
+    title_block = doc["blocks"].pop(0)
+
+    match title_block:
+        case {"t": "Header", "c": [1, _, _]}:
+            title = stringify(title_block)
+        case _:
+            raise PostException("No title")
+
+    return meta, title, doc
+
+
+def process_doc(file: Path, source: Optional[bytes] = None) -> tuple[dict, str, dict]:
+    if source is None:
+        source = file.read_bytes()
+    return split_title(source_to_ast(source))
+
+
+def doc_to_markdown(doc: dict) -> str:
+    with profiling.span("doc_to_markdown"):
+        return get_backend().convert(orjson.dumps(doc), "json", "gfm").decode()
+
+
+def get_mtime(file: Path, *, tz: Timezone = LOCAL_TZ) -> datetime:
+    s = file.stat()
+    return pendulum.from_timestamp(s.st_mtime, tz=tz)
+
+
+def parse_metadata(meta: dict) -> Metadata:
+    try:
+        return Metadata(**parse_meta(meta))
+    except KeyError as e:
+        raise PostException("no id") from e
+
+
+def markdown_to_doc(
+    file: Path,
+    *,
+    timezone: Timezone = LOCAL_TZ,
+    pandoc_filters: Union[FilterPipeline, list[Callable], None] = None,
+    low_memory: bool = False,
+    source: Optional[bytes] = None,
+) -> Post:
+    if isinstance(pandoc_filters, FilterPipeline):
+        pipeline = pandoc_filters
+    else:
+        pipeline = FilterPipeline(pandoc_filters or ())
+
+    body: Optional[str]
+    if low_memory:
+        meta, title, body = render_streaming(file, pipeline)
+        metadata = parse_metadata(meta)
+    else:
+        if source is None:
+            source = file.read_bytes()
+        meta, title, doc = process_doc(file, source)
+        metadata = parse_metadata(meta)
+
+        pipeline(doc, meta=meta)
+
+        body = None
+        if not pipeline.modified:
+            # nothing was rewritten, so the source already is the rendered body
+            body = source_body(source)
+        if body is None:
+            body = doc_to_markdown(doc)
+
+    logger.debug("%s filter timings: %s", file, pipeline.report())
+    return build_post(file, title, body, metadata, timezone=timezone)
+
+
+def build_post(
+    file: Path,
+    title: str,
+    body: str,
+    metadata: Metadata,
+    *,
+    timezone: Timezone = LOCAL_TZ,
+) -> Post:
+    file_stat = file.stat()
+
+    return Post(
+        title=title,
+        created=pendulum.from_timestamp(
+            getattr(file_stat, "st_birthtime", file_stat.st_ctime), tz=timezone
+        ),
+        updated=pendulum.from_timestamp(file_stat.st_mtime, tz=timezone),
+        body=body,
+        **metadata.dict(),
+    )
@@ -1,71 +1,147 @@
 import re
+from functools import lru_cache
+from typing import Callable, Mapping, Optional
 from urllib.parse import ParseResult, parse_qs, urlparse, urlunparse
 
 import lxml.html as html
 from pandocfilters import RawInline
 
+__all__ = ["Embedder", "Provider", "PROVIDERS", "register"]
+
+Provider = Callable[[ParseResult], Optional[str]]
+
+PROVIDERS: dict[str, Provider] = {}
+
+NETLOC_RE = re.compile(r"^[A-Za-z][A-Za-z0-9+.-]*://([^/?#]*)")
+
+
+def register(*netlocs: str) -> Callable[[Provider], Provider]:
+    def decorator(provider: Provider) -> Provider:
+        PROVIDERS.update(dict.fromkeys(netlocs, provider))
+        return provider
+
+    return decorator
+
+
+def format_element(tag: str, attrib: dict[str, str]) -> str:
+    element = html.Element(tag)
+    element.attrib.update(attrib)
+    return html.tostring(element, encoding="unicode")
+
+
+def _youtube_iframe(video_id: str) -> str:
+    return format_element(
+        "iframe",
+        {
+            "width": "560",
+            "height": "315",
+            "src": f"https://www.youtube.com/embed/{video_id}",
+            "title": "YouTube video player",
+            "allow": "accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture; fullscreen",
+            "frameBorder": "0",
+        },
+    )
+
+
+@register("www.youtube.com", "youtube.com", "m.youtube.com")
+def youtube(parse_result: ParseResult) -> Optional[str]:
+    qs = parse_qs(parse_result.query)
+    if "v" not in qs:
+        return None
+    return _youtube_iframe(qs["v"][0])
+
+
+@register("youtu.be")
+def youtu_be(parse_result: ParseResult) -> Optional[str]:
+    video_id = parse_result.path.strip("/")
+    return _youtube_iframe(video_id) if video_id else None
+
+
+@register("replit.com")
+def replit(parse_result: ParseResult) -> str:
+    parse_result = parse_result._replace(query="embed=true")
+    return format_element(
+        "iframe",
+        {
+            "width": "100%",
+            "height": "500",
+            "frameBorder": "0",
+            "src": urlunparse(parse_result),
+        },
+    )
+
+
+@register("codepen.io")
+def codepen(parse_result: ParseResult) -> str:
+    parse_result = parse_result._replace(
+        query="default-tab=html%2Cresult",
+        path=parse_result.path.replace("/pen/", "/embed/"),
+    )
+    return format_element(
+        "iframe",
+        {
+            "width": "100%",
+            "height": "300",
+            "frameBorder": "0",
+            "loading": "lazy",
+            "allow": "fullscreen",
+            "src": urlunparse(parse_result),
+        },
+    )
+
+
+@register("gist.github.com")
+def github_gist(parse_result: ParseResult) -> Optional[str]:
+    parts = parse_result.path.strip("/").split("/")
+    if len(parts) != 2:
+        return None
+    path = "/".join(parts).removesuffix(".js")
+    return format_element("script", {"src": f"https://gist.github.com/{path}.js"})
+
+
+@register("vimeo.com", "www.vimeo.com", "player.vimeo.com")
+def vimeo(parse_result: ParseResult) -> Optional[str]:
+    video_id = parse_result.path.rstrip("/").rsplit("/", 1)[-1]
+    if not video_id.isdigit():
+        return None
+    return format_element(
+        "iframe",
+        {
+            "width": "640",
+            "height": "360",
+            "src": f"https://player.vimeo.com/video/{video_id}",
+            "title": "Vimeo video player",
+            "allow": "autoplay; fullscreen; picture-in-picture",
+            "frameBorder": "0",
+        },
+    )
+
 
 class Embedder:
-    @staticmethod
-    def format_domain(url) -> str:
-        return re.sub(r"\.", "_", url)
-
-    @staticmethod
-    def format_iframe(iframe: html.HtmlElement):
-        return RawInline("html", html.tostring(iframe, encoding="unicode"))
-
-    def www_youtube_com(self, parse_result: ParseResult) -> html.HtmlElement:
-        qs = parse_qs(parse_result.query)
-        iframe = html.Element("iframe")
-        iframe.attrib.update(
-            {
-                "width": "560",
-                "height": "315",
-                "src": f"https://www.youtube.com/embed/{qs['v'][0]}",
-                "title": "YouTube video player",
-                "allow": "accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture; fullscreen",
-                "frameBorder": "0",
-            }
-        )
-        return self.format_iframe(iframe)
-
-    def replit_com(self, parse_result: ParseResult) -> html.HtmlElement:
-        parse_result = parse_result._replace(query="embed=true")
-        iframe = html.Element("iframe")
-        iframe.attrib.update(
-            {
-                "width": "100%",
-                "height": "500",
-                "frameBorder": "0",
-                "src": urlunparse(parse_result),
-            }
-        )
-        return self.format_iframe(iframe)
-
-    def codepen_io(self, parse_result: ParseResult) -> html.HtmlElement:
-        parse_result = parse_result._replace(
-            query="default-tab=html%2Cresult",
-            path=parse_result.path.replace("/pen/", "/embed/"),
-        )
-        iframe = html.Element("iframe")
-        iframe.attrib.update(
-            {
-                "width": "100%",
-                "height": "300",
-                "frameBorder": "0",
-                "loading": "lazy",
-                "allow": "fullscreen",
-                "src": urlunparse(parse_result),
-            }
-        )
-        return self.format_iframe(iframe)
+    node_types = {"Link"}
+
+    def __init__(
+        self,
+        providers: Optional[Mapping[str, Provider]] = None,
+        *,
+        cache_size: Optional[int] = 1024,
+    ):
+        self.providers = dict(PROVIDERS if providers is None else providers)
+        self.render = lru_cache(maxsize=cache_size)(self._render)
+
+    def _render(self, url: str) -> Optional[str]:
+        match = NETLOC_RE.match(url)
+        if match is None:
+            return None
+
+        provider = self.providers.get(match.group(1).lower())
+        if provider is None:
+            return None
+
+        return provider(urlparse(url))
 
     def __call__(self, key, value, format, meta):
         if key == "Link":
-            parse_result = urlparse(value[2][0])
-            try:
-                return getattr(self, self.format_domain(parse_result.netloc))(
-                    parse_result
-                )
-            except AttributeError:
-                pass
+            embed = self.render(value[2][0])
+            if embed is not None:
+                return RawInline("html", embed)
@@ -0,0 +1,240 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional, Sequence
+from urllib.parse import quote
+
+import orjson
+
+from blog_uploader.batch import conversion_settings
+from blog_uploader.document import markdown_to_doc
+from blog_uploader.embedders import Embedder
+from blog_uploader.exceptions import PostException
+from blog_uploader.image_uploaders import ImageUploader
+from blog_uploader.image_uploaders.directory_uploader import DirectoryUploader
+from blog_uploader.image_uploaders.optimizer import ImageOptimizer
+from blog_uploader.image_uploaders.stage import ImageStage
+from blog_uploader.manifest import post_hash, stat_key
+from blog_uploader.pipeline import FilterPipeline
+from blog_uploader.schemas import Post
+
+__all__ = ["ExportReport", "export_posts"]
+
+STATE_FILE = ".export.json"
+PAGE_SIZE = 20
+SUMMARY_FIELDS = {
+    "id",
+    "title",
+    "created",
+    "updated",
+    "summary",
+    "image",
+    "tags",
+    "published",
+}
+
+
+def _dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=str)
+
+
+def _write(path: Path, data: bytes) -> bool:
+    # identical files are left alone so their mtimes, and CDN caches, survive
+    try:
+        if path.read_bytes() == data:
+            return False
+    except FileNotFoundError:
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+    return True
+
+
+def _fresh(path: Path, entry: Optional[dict], publish: bool, settings: str) -> bool:
+    if (
+        entry is None
+        or entry.get("publish") != publish
+        or entry.get("settings", "") != settings
+    ):
+        return False
+    try:
+        return stat_key(path) == entry["stat"] and all(
+            stat_key(path.parent / name) == key for name, key in entry["images"].items()
+        )
+    except FileNotFoundError:
+        return False
+
+
+@dataclass
+class ExportReport:
+    written: list[Path] = field(default_factory=list)
+    unchanged: int = 0
+    drafts: int = 0
+    removed: int = 0
+    failed: list[tuple[Path, Exception]] = field(default_factory=list)
+    elapsed: float = 0.0
+
+
+def _render(
+    path: Path,
+    uploader: ImageUploader,
+    embedder: Embedder,
+    pandoc_filters: Sequence[Callable],
+    optimizer: Optional[ImageOptimizer],
+) -> tuple[Post, list[str]]:
+    image_stage = ImageStage(uploader, path.parent, optimizer=optimizer)
+    pipeline = FilterPipeline([image_stage, embedder, *pandoc_filters])
+    return markdown_to_doc(path, pandoc_filters=pipeline), image_stage.images
+
+
+def _write_listings(directory: Path, posts: list[dict], page_size: int) -> None:
+    posts.sort(key=lambda p: p["created"], reverse=True)
+
+    pages = [posts[i : i + page_size] for i in range(0, len(posts), page_size)]
+    for n, page in enumerate(pages, 1):
+        _write(
+            directory / "pages" / f"{n}.json",
+            _dumps({"page": n, "pages": len(pages), "posts": page}),
+        )
+
+    tags: dict[str, list[dict]] = {}
+    for post in posts:
+        for tag in post.get("tags", ()):
+            tags.setdefault(tag, []).append(post)
+    for tag, tagged in tags.items():
+        _write(directory / "tags" / f"{quote(tag, safe='')}.json", _dumps(tagged))
+
+    _write(
+        directory / "index.json",
+        _dumps(
+            {
+                "posts": len(posts),
+                "pages": len(pages),
+                "page_size": page_size,
+                "tags": {tag: len(tags[tag]) for tag in sorted(tags)},
+            }
+        ),
+    )
+
+    keep = {f"{n}.json" for n in range(1, len(pages) + 1)}
+    keep.update(f"{quote(tag, safe='')}.json" for tag in tags)
+    for listing in (directory / "pages", directory / "tags"):
+        if listing.is_dir():
+            for stale in listing.glob("*.json"):
+                if stale.name not in keep:
+                    stale.unlink()
+
+
+def export_posts(
+    files: Iterable[Path],
+    directory: Path,
+    *,
+    max_workers: Optional[int] = None,
+    page_size: int = PAGE_SIZE,
+    base_url: str = "/",
+    pandoc_filters: Sequence[Callable] = (),
+    image_optimizer: Optional[ImageOptimizer] = None,
+    force: bool = False,
+    publish: bool = False,
+) -> ExportReport:
+    report = ExportReport()
+    start = time.perf_counter()
+
+    directory.mkdir(parents=True, exist_ok=True)
+    state_path = directory / STATE_FILE
+    try:
+        state: dict[str, dict] = orjson.loads(state_path.read_bytes())
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        state = {}
+
+    settings = conversion_settings(pandoc_filters, optimizer=image_optimizer)
+    sources = {str(path.resolve()): path for path in files}
+    fresh = {
+        key: state[key]
+        for key, path in sources.items()
+        if not force and _fresh(path, state.get(key), publish, settings)
+    }
+    report.unchanged = len(fresh)
+    # posts left off this command line stay exported while their sources exist
+    entries = {
+        key: entry
+        for key, entry in state.items()
+        if key not in sources and Path(key).exists()
+    }
+    entries.update(fresh)
+
+    uploader = DirectoryUploader(directory / "images", base_url + "images/")
+    embedder = Embedder()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                _render, path, uploader, embedder, pandoc_filters, image_optimizer
+            ): key
+            for key, path in sources.items()
+            if key not in fresh
+        }
+        for future in as_completed(futures):
+            key = futures[future]
+            path = sources[key]
+            previous = state.get(key)
+            try:
+                post, images = future.result()
+            except (PostException, OSError, ValueError) as e:
+                report.failed.append((path, e))
+                # keep serving the last good export of a post that broke
+                if previous is not None:
+                    entries[key] = previous
+                continue
+
+            # drafts stay off the site unless exported like upload -p
+            post.published = post.published or publish
+
+            summary = orjson.loads(
+                _dumps(post.dict(include=SUMMARY_FIELDS, exclude_none=True))
+            )
+            entry = {
+                "stat": stat_key(path),
+                "images": {name: stat_key(path.parent / name) for name in images},
+                "hash": post_hash(post),
+                "publish": publish,
+                "settings": settings,
+                "post": summary,
+            }
+            entries[key] = entry
+
+            if not post.published:
+                report.drafts += 1
+                continue
+
+            target = directory / "posts" / f"{summary['id']}.json"
+            if (
+                force
+                or previous is None
+                or previous["hash"] != entry["hash"]
+                or previous["post"]["updated"] != summary["updated"]
+                or not target.exists()
+            ):
+                if _write(target, _dumps(post.dict(exclude_none=True))):
+                    report.written.append(target)
+                    continue
+            report.unchanged += 1
+
+    published = [
+        entry["post"] for entry in entries.values() if entry["post"].get("published")
+    ]
+    live = {post["id"] for post in published}
+    for entry in state.values():
+        target = directory / "posts" / f"{entry['post']['id']}.json"
+        if entry["post"]["id"] not in live and target.exists():
+            target.unlink()
+            report.removed += 1
+
+    _write_listings(directory, published, page_size)
+    _write(state_path, orjson.dumps(entries, option=orjson.OPT_INDENT_2))
+
+    report.elapsed = time.perf_counter() - start
+    return report
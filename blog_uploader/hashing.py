@@ -0,0 +1,71 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import BinaryIO, Union
+
+__all__ = ["ALGORITHMS", "file_digest", "file_digests"]
+
+ALGORITHMS = ("md5", "sha256")
+BUFFER_SIZE = 1 << 20
+CACHE_SIZE = 4096
+
+_cache: OrderedDict[tuple, dict[str, bytes]] = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _digest_stream(file: BinaryIO) -> dict[str, bytes]:
+    hashes = [hashlib.new(name) for name in ALGORITHMS]
+    buffer = bytearray(BUFFER_SIZE)
+    view = memoryview(buffer)
+
+    while n := file.readinto(view):  # type: ignore[attr-defined]
+        chunk = view[:n]
+        for h in hashes:
+            h.update(chunk)
+
+    return {name: h.digest() for name, h in zip(ALGORITHMS, hashes)}
+
+
+def _cache_key(fd: int, name: str) -> tuple:
+    s = os.fstat(fd)
+    return os.path.realpath(name), s.st_dev, s.st_ino, s.st_mtime_ns, s.st_size
+
+
+def _cached(key: tuple, file: BinaryIO) -> dict[str, bytes]:
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    digests = _digest_stream(file)
+
+    with _cache_lock:
+        _cache[key] = digests
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return digests
+
+
+def file_digests(file: Union[BinaryIO, str, Path, os.PathLike]) -> dict[str, bytes]:
+    if isinstance(file, (str, Path, os.PathLike)):
+        with open(file, "rb") as f:
+            return _cached(_cache_key(f.fileno(), os.fspath(file)), f)
+
+    loc = file.tell()
+    try:
+        if loc == 0 and isinstance(getattr(file, "name", None), str):
+            try:
+                key = _cache_key(file.fileno(), file.name)
+            except OSError:
+                pass
+            else:
+                return _cached(key, file)
+        return _digest_stream(file)
+    finally:
+        file.seek(loc)
+
+
+def file_digest(file: Union[BinaryIO, str, Path, os.PathLike], name: str) -> bytes:
+    return file_digests(file)[name]
@@ -1,14 +1,34 @@
 import abc
 import os
+from concurrent.futures import Executor
 from contextlib import AbstractContextManager
 from pathlib import Path
-from typing import BinaryIO, Union
+from typing import BinaryIO, Optional, Sequence, Union
+
+from blog_uploader import profiling
 
 
 class ImageUploader(AbstractContextManager):
+    # a URL only ever serves the content first uploaded to it, which the
+    # registry relies on to share one blob between every copy of an image
+    content_addressed = False
+
     @abc.abstractmethod
     def upload(self, file: BinaryIO) -> str:
         ...
 
+    def upload_many(
+        self, files: Sequence[BinaryIO], *, executor: Optional[Executor] = None
+    ) -> list[str]:
+        if executor is None:
+            return [self.upload(f) for f in files]
+        return list(executor.map(profiling.bind(self.upload), files))
+
     def remove(self, path: Union[str, Path, os.PathLike], *args, **kwargs) -> None:
         ...
+
+    def delete_key(self, url: str) -> Optional[str]:
+        return None
+
+    def delete_many(self, keys: Sequence[str]) -> None:
+        ...
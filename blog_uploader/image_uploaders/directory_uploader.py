@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Optional, Sequence, Union
+
+from blog_uploader import profiling
+from blog_uploader.hashing import file_digest
+from blog_uploader.image_uploaders import ImageUploader
+
+__all__ = ["DirectoryUploader"]
+
+
+class DirectoryUploader(ImageUploader):
+    content_addressed = True
+
+    def __init__(self, directory: Path, base_url: str = "images/"):
+        self.directory = directory
+        self.base_url = base_url
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    @staticmethod
+    def name(file: BinaryIO) -> str:
+        # content addressed, so an unchanged image keeps its URL and is not copied
+        return file_digest(file, "sha256").hex()[:32] + Path(file.name).suffix.lower()
+
+    def upload(self, file: BinaryIO) -> str:
+        name = self.name(file)
+        target = self.directory / name
+
+        if target.exists():
+            profiling.count("upload.existing")
+        else:
+            with profiling.span("upload.directory"), tempfile.NamedTemporaryFile(
+                dir=self.directory, prefix=".", delete=False
+            ) as tmp:
+                shutil.copyfileobj(file, tmp)
+            os.replace(tmp.name, target)
+            profiling.count("upload.bytes", target.stat().st_size)
+
+        return self.base_url + name
+
+    def remove(self, path: Union[str, Path, os.PathLike], *args, **kwargs) -> None:
+        with open(path, "rb") as f:
+            (self.directory / self.name(f)).unlink(missing_ok=True)
+
+    def delete_key(self, url: str) -> Optional[str]:
+        return url[len(self.base_url) :] if url.startswith(self.base_url) else None
+
+    def delete_many(self, keys: Sequence[str]) -> None:
+        for key in keys:
+            (self.directory / Path(key).name).unlink(missing_ok=True)
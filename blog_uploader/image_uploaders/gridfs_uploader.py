@@ -1,45 +1,115 @@
 import mimetypes
+import os
 import shutil
-from functools import partial
-from hashlib import md5
+from concurrent.futures import Executor
 from pathlib import Path
-from typing import BinaryIO
+from typing import BinaryIO, Optional, Sequence, Union
 
 import gridfs
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
 from pymongo.database import Database
 
+from blog_uploader import profiling
+from blog_uploader.hashing import file_digest
 from blog_uploader.image_uploaders import ImageUploader
 
 
 class GridFsUploader(ImageUploader):
+    content_addressed = True
+
     URL = "https://api.thoughtbank.app/images/{object_id}/"
 
-    def __init__(self, db: Database, *args, **kwargs):
+    def __init__(self, db: Database, *args, collection: str = "fs", **kwargs):
         super().__init__(*args, **kwargs)
         self.db = db
-        self.fs = gridfs.GridFS(self.db)
+        self.fs = gridfs.GridFS(self.db, collection=collection)
+        self.files = self.db[f"{collection}.files"]
+        self.chunks = self.db[f"{collection}.chunks"]
+        self.files.create_index("metadata.md5")
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         pass
 
-    def upload(self, file: BinaryIO) -> str:
+    @staticmethod
+    def md5(file: BinaryIO) -> str:
+        return file_digest(file, "md5").hex()
+
+    def _put(self, file: BinaryIO, md5_hash: str) -> str:
         mime_type, _ = mimetypes.guess_type(file.name)
         filename = Path(file.name).name
 
-        h = md5()
-        loc = file.tell()
-        for chunk in iter(partial(file.read, 1024), b""):
-            h.update(chunk)
-        md5_hash = h.hexdigest()
-        file.seek(loc)
+        with profiling.span("upload.gridfs"), self.fs.new_file(
+            content_type=mime_type, filename=filename, metadata={"md5": md5_hash}
+        ) as g:
+            shutil.copyfileobj(file, g)
+        profiling.count("upload.bytes", g.length)
+        return self.URL.format(object_id=g._id)
+
+    def upload(self, file: BinaryIO) -> str:
+        md5_hash = self.md5(file)
 
-        f = self.fs.find_one({"metadata.md5": md5_hash})
+        with profiling.span("upload.gridfs.lookup"):
+            f = self.fs.find_one({"metadata.md5": md5_hash})
 
         if f is not None:
+            profiling.count("upload.existing")
             return self.URL.format(object_id=f._id)
 
-        with self.fs.new_file(
-            content_type=mime_type, filename=filename, metadata={"md5": md5_hash}
-        ) as g:
-            shutil.copyfileobj(file, g)
-            return self.URL.format(object_id=g._id)
+        return self._put(file, md5_hash)
+
+    def upload_many(
+        self, files: Sequence[BinaryIO], *, executor: Optional[Executor] = None
+    ) -> list[str]:
+        hashes = list((executor.map if executor else map)(self.md5, files))
+
+        with profiling.span("upload.gridfs.lookup"):
+            existing = {
+                f["metadata"]["md5"]: self.URL.format(object_id=f["_id"])
+                for f in self.files.find(
+                    {"metadata.md5": {"$in": list(set(hashes))}}, {"metadata.md5": 1}
+                )
+            }
+        profiling.count("upload.existing", sum(h in existing for h in hashes))
+
+        missing: dict[str, BinaryIO] = {}
+        for file, md5_hash in zip(files, hashes):
+            if md5_hash not in existing:
+                missing.setdefault(md5_hash, file)
+
+        if executor is None:
+            urls = [self._put(f, h) for h, f in missing.items()]
+        else:
+            urls = list(
+                executor.map(profiling.bind(self._put), missing.values(), missing)
+            )
+        existing.update(zip(missing, urls))
+
+        return [existing[md5_hash] for md5_hash in hashes]
+
+    def remove(self, path: Union[str, Path, os.PathLike], *args, **kwargs) -> None:
+        with open(path, "rb") as f:
+            md5_hash = self.md5(f)
+        ids = [f["_id"] for f in self.files.find({"metadata.md5": md5_hash}, {})]
+        self._delete(ids)
+
+    def delete_key(self, url: str) -> Optional[str]:
+        prefix, suffix = self.URL.split("{object_id}")
+        if url.startswith(prefix) and url.endswith(suffix):
+            return url[len(prefix) : len(url) - len(suffix)]
+        return None
+
+    def _delete(self, ids: list) -> None:
+        # files first, so a file is never readable with its chunks half gone
+        if ids:
+            self.files.delete_many({"_id": {"$in": ids}})
+            self.chunks.delete_many({"files_id": {"$in": ids}})
+
+    def delete_many(self, keys: Sequence[str]) -> None:
+        ids = []
+        for key in keys:
+            try:
+                ids.append(ObjectId(key))
+            except InvalidId:
+                continue
+        self._delete(ids)
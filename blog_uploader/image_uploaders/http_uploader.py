@@ -0,0 +1,58 @@
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import BinaryIO, Optional, Sequence
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from blog_uploader import profiling
+from blog_uploader.image_uploaders import ImageUploader
+
+__all__ = ["HttpUploader"]
+
+
+class HttpUploader(requests.Session, ImageUploader):
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    # the host hands out a new URL for every upload
+    content_addressed = True
+
+    def __init__(
+        self,
+        *args,
+        max_connections: int = 8,
+        retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 60.0,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.max_connections = max_connections
+        self.timeout = timeout
+
+        # one keep-alive pool per host, blocking instead of opening extra
+        # connections when every one of them is busy
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=max_connections,
+            pool_block=True,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=backoff,
+                status_forcelist=self.RETRY_STATUSES,
+                # uploads are POSTs, which urllib3 does not retry by default;
+                # the bodies rewind, so a retry resends the whole image
+                allowed_methods=None,
+                raise_on_status=False,
+            ),
+        )
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def upload_many(
+        self, files: Sequence[BinaryIO], *, executor: Optional[Executor] = None
+    ) -> list[str]:
+        if executor is not None or len(files) < 2:
+            return super().upload_many(files, executor=executor)
+
+        with ThreadPoolExecutor(min(self.max_connections, len(files))) as executor:
+            return list(executor.map(profiling.bind(self.upload), files))
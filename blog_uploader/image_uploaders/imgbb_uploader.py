@@ -1,25 +1,27 @@
-import os
-from base64 import b64encode
-from pathlib import Path
-from typing import BinaryIO, Optional, Union
+from typing import BinaryIO
 
-import requests
-from bson.objectid import ObjectId
-
-from blog_uploader.image_uploaders import ImageUploader
+from blog_uploader import profiling
+from blog_uploader.image_uploaders.http_uploader import HttpUploader
+from blog_uploader.image_uploaders.multipart import Base64Encoder, MultipartBody
 from blog_uploader.image_uploaders.schemas import ImgbbResponse
 
 
-class ImgbbUploader(requests.Session, ImageUploader):
+class ImgbbUploader(HttpUploader):
     def __init__(self, imgbb_api_key: str, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._api_key = imgbb_api_key
 
     def upload(self, file: BinaryIO) -> str:
-        resp = self.post(
-            "https://api.imgbb.com/1/upload",
-            params={"key": self._api_key},
-            data={"image": b64encode(file.read()).decode()},
-        )
+        body = MultipartBody([("image", Base64Encoder(file), None, None)])
+        with profiling.span("upload.imgbb"):
+            resp = self.post(
+                "https://api.imgbb.com/1/upload",
+                params={"key": self._api_key},
+                data=body,
+                headers={"Content-Type": body.content_type},
+                timeout=self.timeout,
+            )
+        profiling.count("upload.bytes", len(body))
+        resp.raise_for_status()
         resp_model = ImgbbResponse.parse_raw(resp.content)
         return resp_model.data.url
@@ -1,22 +1,49 @@
-from typing import BinaryIO
+import mimetypes
+import threading
+from pathlib import Path
+from typing import BinaryIO, Optional, Sequence
 
-import requests
-from bson.objectid import ObjectId
-
-from blog_uploader.image_uploaders import ImageUploader
+from blog_uploader import profiling
+from blog_uploader.image_uploaders.http_uploader import HttpUploader
+from blog_uploader.image_uploaders.multipart import MultipartBody
 from blog_uploader.image_uploaders.schemas import ImgurBasicResponse
 
 
-class ImgurUploader(requests.Session, ImageUploader):
+class ImgurUploader(HttpUploader):
     def __init__(self, imgur_client_id: str, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.headers["Authorization"] = f"Client-ID {imgur_client_id}"
+        self._delete_hashes: dict[str, str] = {}
+        self._delete_lock = threading.Lock()
 
     def upload(self, file: BinaryIO, *args, **kwargs) -> str:
-        resp = self.post(
-            "https://api.imgur.com/3/upload",
-            files={"image": file},
+        filename = Path(file.name).name
+        mime_type, _ = mimetypes.guess_type(filename)
+        body = MultipartBody(
+            [("image", file, filename, mime_type or "application/octet-stream")]
         )
+        with profiling.span("upload.imgur"):
+            resp = self.post(
+                "https://api.imgur.com/3/upload",
+                data=body,
+                headers={"Content-Type": body.content_type},
+                timeout=self.timeout,
+            )
+        profiling.count("upload.bytes", len(body))
+        resp.raise_for_status()
         resp_model = ImgurBasicResponse.parse_raw(resp.content)
 
+        with self._delete_lock:
+            self._delete_hashes[resp_model.data.link] = resp_model.data.deletehash
         return resp_model.data.link
+
+    def delete_key(self, url: str) -> Optional[str]:
+        with self._delete_lock:
+            return self._delete_hashes.get(url)
+
+    def delete_many(self, keys: Sequence[str]) -> None:
+        # imgur has no batch delete, but the requests share pooled connections
+        for key in keys:
+            self.delete(
+                f"https://api.imgur.com/3/image/{key}", timeout=self.timeout
+            ).raise_for_status()
@@ -0,0 +1,196 @@
+import base64
+import io
+import os
+import uuid
+from typing import BinaryIO, Optional, Protocol, Sequence, Union
+
+__all__ = ["Base64Encoder", "MultipartBody", "Readable"]
+
+CHUNK_SIZE = 48 * 1024
+
+
+class Readable(Protocol):
+    # what a streamed part needs: an open file, or a Base64Encoder over one
+    def read(self, size: int = -1, /) -> Optional[bytes]:
+        ...
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET, /) -> int:
+        ...
+
+    def tell(self) -> int:
+        ...
+
+    def fileno(self) -> int:
+        ...
+
+
+def _remaining(stream: Readable) -> int:
+    if hasattr(stream, "__len__"):
+        return len(stream) - stream.tell()  # type: ignore[arg-type]
+    return os.fstat(stream.fileno()).st_size - stream.tell()
+
+
+class Base64Encoder(io.RawIOBase):
+    # encodes a file while it is read, holding one chunk instead of the
+    # whole file, its base64 bytes and a str copy of them
+    def __init__(self, file: BinaryIO, chunk_size: int = CHUNK_SIZE):
+        self.file = file
+        self.start = file.tell()
+        self.size = _remaining(file)
+        # whole 3 byte groups encode without padding, so chunks concatenate
+        self.chunk_size = max(chunk_size - chunk_size % 3, 3)
+        self._buffer = b""
+        self._offset = 0
+        self._position = 0
+
+    def __len__(self) -> int:
+        return (self.size + 2) // 3 * 4
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        match whence:
+            case io.SEEK_CUR:
+                offset += self._position
+            case io.SEEK_END:
+                offset += len(self)
+        offset = min(max(offset, 0), len(self))
+
+        # every 4 output bytes come from 3 input bytes
+        group = offset // 4
+        self.file.seek(self.start + group * 3)
+        self._buffer = b""
+        self._offset = 0
+        self._position = group * 4
+        if offset > self._position:
+            self.read(offset - self._position)
+        return self._position
+
+    def readinto(self, b) -> int:
+        if self._offset >= len(self._buffer):
+            data = self.file.read(self.chunk_size)
+            while data and len(data) < self.chunk_size:
+                more = self.file.read(self.chunk_size - len(data))
+                if not more:
+                    break
+                data += more
+            self._buffer = base64.b64encode(data)
+            self._offset = 0
+
+        n = min(len(b), len(self._buffer) - self._offset)
+        b[:n] = self._buffer[self._offset : self._offset + n]
+        self._offset += n
+        self._position += n
+        return n
+
+
+class MultipartBody(io.RawIOBase):
+    # a multipart/form-data body that streams its file parts, with a known
+    # length so requests sends Content-Length, and seekable so a retry can
+    # rewind it
+    def __init__(
+        self,
+        fields: Sequence[
+            tuple[str, Union[str, bytes, Readable], Optional[str], Optional[str]]
+        ],
+    ):
+        self.boundary = uuid.uuid4().hex
+        self.segments: list[tuple[int, Union[bytes, Readable], int]] = []
+
+        length = 0
+        for name, value, filename, content_type in fields:
+            header = (
+                f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"'
+            )
+            if filename is not None:
+                quoted = filename.replace('"', "%22")
+                header += f'; filename="{quoted}"'
+            if content_type is not None:
+                header += f"\r\nContent-Type: {content_type}"
+            header += "\r\n\r\n"
+
+            if isinstance(value, str):
+                value = value.encode()
+            parts = [header.encode(), value, b"\r\n"]
+            for part in parts:
+                if isinstance(part, bytes):
+                    self.segments.append((length, part, 0))
+                    length += len(part)
+                else:
+                    self.segments.append((length, part, part.tell()))
+                    length += _remaining(part)
+        trailer = f"--{self.boundary}--\r\n".encode()
+        self.segments.append((length, trailer, 0))
+        self.length = length + len(trailer)
+
+        self._index = 0
+        self._position = 0
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self) -> int:
+        return self.length
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        match whence:
+            case io.SEEK_CUR:
+                offset += self._position
+            case io.SEEK_END:
+                offset += self.length
+        self._position = min(max(offset, 0), self.length)
+
+        self._index = len(self.segments) - 1
+        for i, (start, _, _) in enumerate(self.segments):
+            if start > self._position:
+                self._index = i - 1
+                break
+        start, segment, origin = self.segments[self._index]
+        if not isinstance(segment, bytes):
+            segment.seek(origin + self._position - start)
+        return self._position
+
+    def _end(self, index: int) -> int:
+        if index + 1 < len(self.segments):
+            return self.segments[index + 1][0]
+        return self.length
+
+    def readinto(self, b) -> int:
+        while self._index < len(self.segments):
+            start, segment, _ = self.segments[self._index]
+            want = min(len(b), self._end(self._index) - self._position)
+            data: Optional[bytes]
+            if isinstance(segment, bytes):
+                offset = self._position - start
+                data = segment[offset : offset + want]
+            else:
+                data = segment.read(want)
+
+            if data:
+                b[: len(data)] = data
+                self._position += len(data)
+                return len(data)
+
+            self._index += 1
+            if self._index < len(self.segments):
+                start, segment, origin = self.segments[self._index]
+                if not isinstance(segment, bytes):
+                    segment.seek(origin)
+        return 0
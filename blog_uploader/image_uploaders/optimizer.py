@@ -0,0 +1,188 @@
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import AbstractContextManager, contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Iterator, Optional, Sequence, Union
+
+import orjson
+
+from blog_uploader import profiling
+from blog_uploader.manifest import file_hash
+from blog_uploader.settings import cache_dir
+
+__all__ = ["FORMATS", "ImageOptimizer", "Variant", "default_cache_dir"]
+
+FORMATS = ("avif", "webp", "jpeg", "png")
+SUFFIXES = {".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tif", ".tiff"}
+WIDTHS = (480, 960, 1600)
+
+
+def default_cache_dir() -> Path:
+    return cache_dir() / "images"
+
+
+@dataclass(frozen=True)
+class Variant:
+    path: Path
+    width: int
+    height: int
+    format: str
+
+    @property
+    def mime_type(self) -> str:
+        return f"image/{self.format}"
+
+
+@contextmanager
+def _replacing(path: Path) -> Iterator[IO[bytes]]:
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=".", delete=False) as tmp:
+        yield tmp
+    os.replace(tmp.name, path)
+
+
+def _save(image, path: Path, fmt: str, quality: int) -> None:
+    with _replacing(path) as tmp:
+        match fmt:
+            case "png":
+                image.save(tmp, "PNG", optimize=True)
+            case "jpeg":
+                image.convert("RGB").save(
+                    tmp, "JPEG", quality=quality, optimize=True, progressive=True
+                )
+            case _:
+                image.save(tmp, fmt.upper(), quality=quality)
+
+
+def _render(
+    source: str,
+    directory: str,
+    key: str,
+    widths: Sequence[int],
+    formats: Sequence[str],
+    quality: int,
+) -> list[tuple[str, int, int, str]]:
+    # runs in a worker process, so Pillow is only imported where it is used
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as opened:
+        if getattr(opened, "is_animated", False):
+            return []
+
+        image = ImageOps.exif_transpose(opened)
+        alpha = "A" in image.getbands() or "transparency" in image.info
+        image = image.convert("RGBA" if alpha else "RGB")
+        # drops EXIF, XMP, ICC and text chunks along with the original file
+        image.info.clear()
+
+    rendered = []
+    for width in sorted({min(w, image.width) for w in widths}):
+        height = max(round(image.height * width / image.width), 1)
+        resized = (
+            image
+            if width == image.width
+            else image.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+        )
+        for fmt in formats:
+            name = f"{key}-{width}.{fmt}"
+            _save(resized, Path(directory, name), fmt, quality)
+            rendered.append((name, width, height, fmt))
+    return rendered
+
+
+class ImageOptimizer(AbstractContextManager):
+    def __init__(
+        self,
+        cache_dir: Union[str, Path, None] = None,
+        *,
+        widths: Sequence[int] = WIDTHS,
+        formats: Sequence[str] = ("webp",),
+        quality: int = 80,
+        max_workers: Optional[int] = None,
+    ):
+        unknown = set(formats) - set(FORMATS)
+        if unknown:
+            raise ValueError(f"unsupported image formats: {', '.join(unknown)}")
+        if not widths or not formats:
+            raise ValueError("at least one width and one format are required")
+
+        self.cache_dir = (
+            Path(cache_dir) if cache_dir is not None else default_cache_dir()
+        )
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.widths = tuple(sorted(set(widths)))
+        self.formats = tuple(formats)
+        self.quality = quality
+        self.max_workers = max_workers
+        self._settings = orjson.dumps([self.widths, self.formats, self.quality])
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def settings(self) -> dict:
+        return {
+            "widths": self.widths,
+            "formats": self.formats,
+            "quality": self.quality,
+        }
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        # the pool only starts once an image misses the cache; spawned rather
+        # than forked since the parent runs pandoc and upload threads
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    @staticmethod
+    def accepts(path: Path) -> bool:
+        return path.suffix.lower() in SUFFIXES
+
+    def key(self, digest: str) -> str:
+        return hashlib.sha256(digest.encode() + self._settings).hexdigest()[:32]
+
+    def optimize(self, path: Path, digest: Optional[str] = None) -> list[Variant]:
+        key = self.key(digest or file_hash(path))
+        index = self.cache_dir / f"{key}.json"
+
+        try:
+            rendered = orjson.loads(index.read_bytes())
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            rendered = None
+        else:
+            if not all((self.cache_dir / entry[0]).exists() for entry in rendered):
+                rendered = None
+
+        if rendered is None:
+            profiling.count("image.cache_misses")
+            with profiling.span("image.optimize"):
+                rendered = self.executor.submit(
+                    _render,
+                    str(path),
+                    str(self.cache_dir),
+                    key,
+                    self.widths,
+                    self.formats,
+                    self.quality,
+                ).result()
+            # written last, so a crash mid-render never leaves a partial entry
+            with _replacing(index) as f:
+                f.write(orjson.dumps(rendered))
+        else:
+            profiling.count("image.cache_hits")
+
+        return [
+            Variant(self.cache_dir / name, width, height, fmt)
+            for name, width, height, fmt in rendered
+        ]
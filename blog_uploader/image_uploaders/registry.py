@@ -0,0 +1,247 @@
+import datetime
+import html
+import os
+import re
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import BinaryIO, Iterable, Optional, Sequence
+
+from pymongo import ASCENDING, IndexModel, UpdateMany, UpdateOne
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+from blog_uploader import profiling
+from blog_uploader.hashing import file_digest
+from blog_uploader.image_uploaders import ImageUploader
+from blog_uploader.schemas import Image, ObjectId
+
+__all__ = [
+    "IMAGE_INDEXES",
+    "CollectReport",
+    "ImageRegistry",
+    "link_posts",
+    "reference_writes",
+]
+
+IMAGE_INDEXES = [
+    IndexModel([("url", ASCENDING)]),
+    IndexModel([("posts", ASCENDING)]),
+    IndexModel([("released", ASCENDING)]),
+]
+
+BATCH_SIZE = 1000
+
+URL_RE = re.compile(r"https?://[^\s\"'<>()\[\]]+")
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def reference_writes(post_id: ObjectId, urls: Iterable[str]) -> list[UpdateMany]:
+    # a post holds exactly the images it links to now, so dropped ones are
+    # released and become collectable once nothing else links to them
+    urls = sorted(set(urls))
+    return [
+        UpdateMany({"url": {"$in": urls}}, {"$addToSet": {"posts": post_id}}),
+        UpdateMany(
+            {"posts": post_id, "url": {"$nin": urls}},
+            {"$pull": {"posts": post_id}, "$set": {"released": _now()}},
+        ),
+    ]
+
+
+def _linked_urls(post: dict) -> set[str]:
+    urls = {
+        html.unescape(match).rstrip(".,;:")
+        for match in URL_RE.findall(post.get("body", ""))
+    }
+    if post.get("image"):
+        urls.add(post["image"])
+    return urls
+
+
+def link_posts(
+    posts: Collection, images: Collection, urls: Optional[Iterable[str]] = None
+) -> int:
+    # posts written before the registry, or before an uploader handed back a
+    # blob it already stored, link images the registry does not list them
+    # under; their bodies are the only record of those links
+    registered = {
+        doc["url"]
+        for doc in images.find(
+            {} if urls is None else {"url": {"$in": sorted(set(urls))}}, {"url": 1}
+        )
+    }
+    if not registered:
+        return 0
+
+    links: dict[str, list[ObjectId]] = {}
+    for post in posts.find({}, {"body": 1, "image": 1}):
+        for url in _linked_urls(post) & registered:
+            links.setdefault(url, []).append(post["_id"])
+
+    ops = [
+        UpdateMany({"url": url}, {"$addToSet": {"posts": {"$each": ids}}})
+        for url, ids in links.items()
+    ]
+    for start in range(0, len(ops), BATCH_SIZE):
+        images.bulk_write(ops[start : start + BATCH_SIZE], ordered=False)
+    return len(links)
+
+
+@dataclass
+class CollectReport:
+    removed: int = 0
+    bytes: int = 0
+    kept: int = 0
+
+
+class ImageRegistry(ImageUploader):
+    content_addressed = True
+
+    def __init__(
+        self, db: Database, uploader: ImageUploader, *, collection: str = "images"
+    ):
+        if not uploader.content_addressed:
+            # two images stored under one URL would share a registry entry
+            # and be collected together
+            raise ValueError(
+                f"{type(uploader).__name__} can store different images under "
+                "one URL and cannot back the registry"
+            )
+        self.posts = db.posts
+        self.images = db[collection]
+        self.uploader = uploader
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return self.uploader.__exit__(exc_type, exc_val, exc_tb)
+
+    @staticmethod
+    def sha256(file: BinaryIO) -> str:
+        return file_digest(file, "sha256").hex()
+
+    def upload(self, file: BinaryIO) -> str:
+        return self.upload_many([file])[0]
+
+    def upload_many(
+        self, files: Sequence[BinaryIO], *, executor: Optional[Executor] = None
+    ) -> list[str]:
+        hashes = list((executor.map if executor else map)(self.sha256, files))
+
+        with profiling.span("registry.lookup"):
+            # an unlinked image found here is about to be linked again; pushing
+            # its release forward keeps a concurrent gc from deleting it first
+            self.images.update_many(
+                {"_id": {"$in": list(set(hashes))}, "posts.0": {"$exists": False}},
+                {"$set": {"released": _now()}},
+            )
+            urls = {
+                doc["_id"]: doc["url"]
+                for doc in self.images.find(
+                    {"_id": {"$in": list(set(hashes))}}, {"url": 1}
+                )
+            }
+        profiling.count("upload.existing", sum(h in urls for h in hashes))
+
+        missing: dict[str, BinaryIO] = {}
+        for file, digest in zip(files, hashes):
+            if digest not in urls:
+                missing.setdefault(digest, file)
+
+        if missing:
+            uploaded = self.uploader.upload_many(
+                list(missing.values()), executor=executor
+            )
+            now = _now()
+            result = self.images.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": digest},
+                        {
+                            "$setOnInsert": Image(
+                                id=digest,
+                                url=url,
+                                delete_key=self.uploader.delete_key(url),
+                                size=os.fstat(file.fileno()).st_size,
+                                created=now,
+                                released=now,
+                            ).dict(by_alias=True, exclude_none=True)
+                        },
+                        upsert=True,
+                    )
+                    for (digest, file), url in zip(missing.items(), uploaded)
+                ],
+                ordered=False,
+            )
+            urls.update(zip(missing, uploaded))
+
+            # another upload of the same content registered first, so its URL
+            # is the one posts link and gc tracks; ours would only leak
+            lost = [
+                digest
+                for i, digest in enumerate(missing)
+                if i not in (result.upserted_ids or {})
+            ]
+            if lost:
+                registered = {
+                    doc["_id"]: doc["url"]
+                    for doc in self.images.find({"_id": {"$in": lost}}, {"url": 1})
+                }
+                keys = []
+                for digest, url in registered.items():
+                    key = self.uploader.delete_key(urls[digest])
+                    if url != urls[digest] and key is not None:
+                        keys.append(key)
+                if keys:
+                    profiling.count("upload.duplicates", len(keys))
+                    self.uploader.delete_many(keys)
+                urls.update(registered)
+
+        return [urls[digest] for digest in hashes]
+
+    def release(self, post_id: ObjectId) -> None:
+        self.images.update_many(
+            {"posts": post_id},
+            {"$pull": {"posts": post_id}, "$set": {"released": _now()}},
+        )
+
+    def collect(
+        self, *, grace: datetime.timedelta, dry_run: bool = False
+    ) -> CollectReport:
+        # images younger than the grace period may belong to an upload whose
+        # post has not been written yet
+        query = {
+            "posts.0": {"$exists": False},
+            "released": {"$lt": _now() - grace},
+        }
+        report = CollectReport()
+
+        candidates = list(self.images.find(query, {"url": 1}))
+        if candidates:
+            # nothing is removed while a post body still links it, whatever
+            # the references say
+            with profiling.span("registry.link_posts"):
+                link_posts(self.posts, self.images, [doc["url"] for doc in candidates])
+
+        candidates = list(self.images.find(query, {"delete_key": 1, "size": 1}))
+        for start in range(0, len(candidates), BATCH_SIZE):
+            batch = candidates[start : start + BATCH_SIZE]
+            ids = [doc["_id"] for doc in batch]
+            if not dry_run:
+                self.images.delete_many({**query, "_id": {"$in": ids}})
+                # anything still registered was linked again in the meantime
+                kept = {
+                    doc["_id"] for doc in self.images.find({"_id": {"$in": ids}}, {})
+                }
+                batch = [doc for doc in batch if doc["_id"] not in kept]
+                report.kept += len(kept)
+
+                keys = [doc["delete_key"] for doc in batch if doc.get("delete_key")]
+                if keys:
+                    with profiling.span("registry.delete_many"):
+                        self.uploader.delete_many(keys)
+
+            report.removed += len(batch)
+            report.bytes += sum(doc.get("size", 0) for doc in batch)
+        return report
@@ -1,63 +1,190 @@
 import base64
 import hashlib
 import os
-from functools import partial
+import threading
 from pathlib import Path
-from typing import BinaryIO, Union
-from urllib.parse import quote
+from typing import Any, BinaryIO, Optional, Sequence, Union
+from urllib.parse import quote, unquote
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 
+from blog_uploader import profiling
+from blog_uploader.hashing import file_digest
 from blog_uploader.image_uploaders import ImageUploader
-from blog_uploader.image_uploaders.exceptions import ChecksumMismatch
+from blog_uploader.image_uploaders.exceptions import (
+    ChecksumMismatch,
+    S3UploaderException,
+)
 
 __all__ = ["S3Uploader"]
 
+MiB = 1024 * 1024
+DELETE_BATCH = 1000
+
 
 class S3Uploader(ImageUploader):
     def __init__(
-        self, aws_access_key_id: str, aws_secret_access_key: str, s3_bucket: str
+        self,
+        aws_access_key_id: str,
+        aws_secret_access_key: str,
+        s3_bucket: str,
+        *,
+        prefix: str = "",
+        endpoint_url: Optional[str] = None,
+        client: Any = None,
+        transfer_config: Optional[TransferConfig] = None,
+        content_addressed: bool = False,
     ):
-        self.client = boto3.client(
+        self.client = client or boto3.client(
             "s3",
             aws_access_key_id=aws_access_key_id,
             aws_secret_access_key=aws_secret_access_key,
+            endpoint_url=endpoint_url,
         )
         self.s3_bucket = s3_bucket
+        self.prefix = prefix
+        # keys are the file's name unless they are named after its content
+        self.content_addressed = content_addressed
+        self.transfer_config = transfer_config or TransferConfig(
+            multipart_threshold=8 * MiB,
+            multipart_chunksize=8 * MiB,
+            max_concurrency=10,
+        )
+        self._index: Optional[dict[str, tuple[int, str]]] = None
+        self._index_lock = threading.Lock()
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         pass
 
     @staticmethod
     def sha256(file: BinaryIO) -> bytes:
-        t = file.tell()
-        m = hashlib.sha256()
-        for chunk in iter(partial(file.read, 1024), b""):
-            m.update(chunk)
-        file.seek(t)
-        return m.digest()
+        return file_digest(file, "sha256")
+
+    @property
+    def index(self) -> dict[str, tuple[int, str]]:
+        with self._index_lock:
+            if self._index is None:
+                index = {}
+                paginator = self.client.get_paginator("list_objects_v2")
+                for page in paginator.paginate(
+                    Bucket=self.s3_bucket, Prefix=self.prefix
+                ):
+                    for obj in page.get("Contents", ()):
+                        index[obj["Key"]] = (obj["Size"], obj["ETag"].strip('"'))
+                self._index = index
+            return self._index
+
+    def etag(self, file: BinaryIO, size: int) -> str:
+        if size < self.transfer_config.multipart_threshold:
+            return file_digest(file, "md5").hex()
+
+        loc = file.tell()
+        chunksize = self.transfer_config.multipart_chunksize
+        parts = []
+        while chunk := file.read(chunksize):
+            parts.append(hashlib.md5(chunk).digest())
+        file.seek(loc)
+        return f"{hashlib.md5(b''.join(parts)).hexdigest()}-{len(parts)}"
+
+    def checksum(self, file: BinaryIO, size: int) -> str:
+        # what S3 reports as ChecksumSHA256: the object's digest, or for a
+        # multipart upload the digest of its parts' digests
+        if size < self.transfer_config.multipart_threshold:
+            digest = self.sha256(file)
+        else:
+            loc = file.tell()
+            chunksize = self.transfer_config.multipart_chunksize
+            parts = []
+            while chunk := file.read(chunksize):
+                parts.append(hashlib.sha256(chunk).digest())
+            file.seek(loc)
+            digest = hashlib.sha256(b"".join(parts)).digest()
+        return base64.b64encode(digest).decode()
+
+    def key(self, file: BinaryIO) -> str:
+        name = Path(file.name)
+        if self.content_addressed:
+            return self.prefix + self.sha256(file).hex()[:32] + name.suffix.lower()
+        return self.prefix + name.name
+
+    def url(self, key: str) -> str:
+        return f"https://s3.amazonaws.com/{quote(self.s3_bucket)}/{quote(key)}"
 
     def upload(self, file: BinaryIO) -> str:
-        key = Path(file.name).name
-        checksum = self.sha256(file)
+        key = self.key(file)
+        size = os.fstat(file.fileno()).st_size - file.tell()
+
+        existing = self.index.get(key)
+        # listing only reports sizes and MD5-based ETags, so compare sizes first
+        # and only hash when they match
+        etag = None
+        if existing is not None and existing[0] == size:
+            etag = self.etag(file, size)
+            if etag == existing[1]:
+                profiling.count("upload.existing")
+                return self.url(key)
 
-        try:
-            resp = self.client.get_object_attributes(
-                Bucket=self.s3_bucket, Key=key, ObjectAttributes=["Checksum"]
+        checksum = self.checksum(file, size)
+        with profiling.span("upload.s3"):
+            self.client.upload_fileobj(
+                file,
+                self.s3_bucket,
+                key,
+                ExtraArgs={"ChecksumAlgorithm": "SHA256"},
+                Config=self.transfer_config,
             )
-            if checksum != base64.b64decode(resp["Checksum"]["ChecksumSHA256"]):
-                raise ChecksumMismatch
-        except (self.client.exceptions.NoSuchKey, ChecksumMismatch, KeyError):
-            self.client.put_object(
-                Bucket=self.s3_bucket,
-                Body=file,
-                Key=key,
-                ChecksumAlgorithm="SHA256",
-                ChecksumSHA256=base64.b64encode(checksum).decode(),
+            head = self.client.head_object(
+                Bucket=self.s3_bucket, Key=key, ChecksumMode="ENABLED"
             )
+        profiling.count("upload.bytes", size)
 
-        return f"https://s3.amazonaws.com/{quote(self.s3_bucket)}/{quote(key)}"
+        # a multipart checksum is reported with its part count appended
+        stored = head.get("ChecksumSHA256")
+        if stored is not None and stored.split("-")[0] != checksum:
+            self.client.delete_object(Bucket=self.s3_bucket, Key=key)
+            with self._index_lock:
+                if self._index is not None:
+                    self._index.pop(key, None)
+            raise ChecksumMismatch(
+                f"{key} was stored with SHA-256 {stored}, expected {checksum}"
+            )
+
+        index = self.index
+        with self._index_lock:
+            index[key] = (size, head["ETag"].strip('"'))
+
+        return self.url(key)
 
     def remove(self, path: Union[str, Path, os.PathLike], *args, **kwargs) -> None:
-        p = Path(path)
-        self.client.delete_object(Key=p.name, Bucket=self.s3_bucket)
+        if self.content_addressed:
+            with open(path, "rb") as f:
+                key = self.key(f)
+        else:
+            key = self.prefix + Path(path).name
+        self.client.delete_object(Key=key, Bucket=self.s3_bucket)
+        with self._index_lock:
+            if self._index is not None:
+                self._index.pop(key, None)
+
+    def delete_key(self, url: str) -> Optional[str]:
+        prefix = self.url("")
+        return unquote(url[len(prefix) :]) if url.startswith(prefix) else None
+
+    def delete_many(self, keys: Sequence[str]) -> None:
+        # DeleteObjects takes up to 1000 keys per request
+        for start in range(0, len(keys), DELETE_BATCH):
+            batch = keys[start : start + DELETE_BATCH]
+            resp = self.client.delete_objects(
+                Bucket=self.s3_bucket,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+            )
+            if resp.get("Errors"):
+                error = resp["Errors"][0]
+                raise S3UploaderException(
+                    f"cannot delete {error['Key']}: {error['Message']}"
+                )
+            with self._index_lock:
+                if self._index is not None:
+                    for key in batch:
+                        self._index.pop(key, None)
@@ -0,0 +1,161 @@
+import html
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Optional
+
+from pandocfilters import Image, RawInline, stringify
+
+from blog_uploader import profiling
+from blog_uploader.document import iter_nodes
+from blog_uploader.image_uploaders import ImageUploader
+from blog_uploader.image_uploaders.optimizer import ImageOptimizer, Variant
+from blog_uploader.manifest import file_state
+
+__all__ = ["ImageStage", "picture_html"]
+
+
+def _srcset(variants: list[tuple[Variant, str]]) -> str:
+    return ", ".join(f"{html.escape(url)} {v.width}w" for v, url in variants)
+
+
+def picture_html(
+    attr: list, alt: str, title: str, variants: list[tuple[Variant, str]]
+) -> str:
+    by_format: dict[str, list[tuple[Variant, str]]] = {}
+    for variant, url in variants:
+        by_format.setdefault(variant.format, []).append((variant, url))
+
+    *sources, fallback = by_format.values()
+    largest, src = max(fallback, key=lambda pair: pair[0].width)
+    sizes = f"(max-width: {largest.width}px) 100vw, {largest.width}px"
+
+    ident, classes, _ = attr
+    img = [
+        f'<img src="{html.escape(src)}" srcset="{_srcset(fallback)}" sizes="{sizes}"',
+        f'width="{largest.width}" height="{largest.height}"',
+        f'alt="{html.escape(alt)}"',
+    ]
+    if ident:
+        img.append(f'id="{html.escape(ident)}"')
+    if classes:
+        img.append(f'class="{html.escape(" ".join(classes))}"')
+    if title:
+        img.append(f'title="{html.escape(title)}"')
+    img.append('loading="lazy" decoding="async">')
+
+    if not sources:
+        return " ".join(img)
+
+    # browsers take the first source they can decode and fall back to the img
+    return (
+        "<picture>"
+        + "".join(
+            f'<source type="{source[0][0].mime_type}" srcset="{_srcset(source)}" '
+            f'sizes="{sizes}">'
+            for source in sources
+        )
+        + " ".join(img)
+        + "</picture>"
+    )
+
+
+class ImageStage:
+    node_types = {"Image"}
+
+    def __init__(
+        self,
+        uploader: ImageUploader,
+        base: Path,
+        *,
+        executor: Optional[Executor] = None,
+        max_workers: int = 8,
+        optimizer: Optional[ImageOptimizer] = None,
+    ):
+        self.uploader = uploader
+        self.base = base
+        self.executor = executor
+        self.max_workers = max_workers
+        self.optimizer = optimizer
+        self.urls: dict[str, str] = {}
+        self.states: dict[str, list] = {}
+        self.variants: dict[str, list[tuple[Variant, str]]] = {}
+
+    @property
+    def images(self) -> list[str]:
+        return list(self.urls)
+
+    @property
+    def image_urls(self) -> list[str]:
+        urls = set(self.urls.values())
+        for variants in self.variants.values():
+            urls.update(url for _, url in variants)
+        return sorted(urls)
+
+    def _variants(self, name: str, digest: str) -> list[Variant]:
+        if self.optimizer is None or not self.optimizer.accepts(self.base / name):
+            return []
+        return self.optimizer.optimize(self.base / name, digest)
+
+    def _resolve(self, names: list[str]):
+        with ExitStack() as stack:
+            executor = self.executor or stack.enter_context(
+                ThreadPoolExecutor(min(self.max_workers, len(names)))
+            )
+
+            same_content: dict[str, list[str]] = {}
+            for name, state in zip(
+                names, executor.map(lambda n: file_state(self.base / n), names)
+            ):
+                self.states[name] = state
+                same_content.setdefault(state[2], []).append(name)
+
+            groups = list(same_content.values())
+            variants = list(
+                executor.map(
+                    profiling.bind(lambda item: self._variants(item[1][0], item[0])),
+                    same_content.items(),
+                )
+            )
+
+            # an image without variants is uploaded as it is
+            paths = [
+                [v.path for v in vs] if vs else [self.base / group[0]]
+                for group, vs in zip(groups, variants)
+            ]
+            files = [
+                stack.enter_context(open(path, "rb")) for ps in paths for path in ps
+            ]
+            urls = iter(self.uploader.upload_many(files, executor=executor))
+
+            for group, vs, ps in zip(groups, variants, paths):
+                group_urls = [next(urls) for _ in ps]
+                if vs:
+                    pairs = list(zip(vs, group_urls))
+                    self.variants.update(dict.fromkeys(group, pairs))
+                    group_urls = [max(pairs, key=lambda p: p[0].width)[1]]
+                self.urls.update(dict.fromkeys(group, group_urls[0]))
+
+    def prepare(self, doc: dict):
+        names = list(
+            dict.fromkeys(
+                node["c"][2][0] for node in iter_nodes(doc["blocks"], "Image")
+            )
+        )
+        names = [name for name in names if name not in self.urls]
+        if names:
+            self._resolve(names)
+
+    def __call__(self, key, value, format, meta):
+        if key == "Image":
+            name = value[2][0]
+            if name not in self.urls:
+                self._resolve([name])
+
+            variants = self.variants.get(name)
+            if variants:
+                return RawInline(
+                    "html",
+                    picture_html(value[0], stringify(value[1]), value[2][1], variants),
+                )
+            return Image(*value[:2], [self.urls[name], ""])
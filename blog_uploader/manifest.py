@@ -0,0 +1,177 @@
+import hashlib
+import threading
+from pathlib import Path
+
+import orjson
+
+from blog_uploader.hashing import file_digest
+from blog_uploader.schemas import Post
+
+__all__ = [
+    "Manifest",
+    "ManifestSet",
+    "file_hash",
+    "file_state",
+    "is_current",
+    "post_hash",
+    "read_source",
+    "settings_digest",
+    "stat_key",
+]
+
+
+def file_hash(path: Path) -> str:
+    return file_digest(path, "sha256").hex()
+
+
+def post_hash(post: Post) -> str:
+    # created/updated follow the file's mtime, so they are left out to make a
+    # touched but otherwise unchanged post hash the same
+    doc = post.dict(by_alias=True, exclude_none=True, exclude={"created", "updated"})
+    return hashlib.sha256(
+        orjson.dumps(doc, default=str, option=orjson.OPT_SORT_KEYS)
+    ).hexdigest()
+
+
+def settings_digest(settings: dict) -> str:
+    # settings left at their defaults are dropped, so a plain run keeps the
+    # entries recorded before there was anything to compare
+    active = {key: value for key, value in settings.items() if value}
+    if not active:
+        return ""
+    return hashlib.sha256(orjson.dumps(active, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def stat_key(path: Path) -> list[int]:
+    s = path.stat()
+    return [s.st_mtime_ns, s.st_size]
+
+
+# a file's state is [mtime_ns, size, sha256]; the stat is taken before the
+# content is read, so a save in between changes the stat and the next run
+# rehashes instead of trusting a digest of other bytes
+def file_state(path: Path) -> list:
+    key = stat_key(path)
+    return [*key, file_hash(path)]
+
+
+def read_source(path: Path) -> tuple[bytes, list]:
+    key = stat_key(path)
+    source = path.read_bytes()
+    return source, [*key, hashlib.sha256(source).hexdigest()]
+
+
+def is_current(path: Path, state: list) -> bool:
+    return stat_key(path) == state[:2]
+
+
+class Manifest:
+    FILENAME = ".blog_uploader.json"
+
+    def __init__(self, directory: Path, settings: str = ""):
+        self.path = directory / self.FILENAME
+        self.directory = directory
+        # digest of the conversion settings, a post converted differently is
+        # not fresh however unchanged its source is
+        self.settings = settings
+        self._lock = threading.Lock()
+        self._dirty = False
+
+        try:
+            self.entries: dict[str, dict] = orjson.loads(self.path.read_bytes())
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            self.entries = {}
+
+    def _images_unchanged(self, file: Path, images: dict[str, list]) -> bool:
+        for name, (mtime_ns, size, digest) in images.items():
+            image = file.parent / name
+            try:
+                key = stat_key(image)
+            except FileNotFoundError:
+                return False
+            if key == [mtime_ns, size]:
+                continue
+            if file_hash(image) != digest:
+                return False
+            with self._lock:
+                images[name] = [*key, digest]
+                self._dirty = True
+        return True
+
+    def is_fresh(self, file: Path, published: bool) -> bool:
+        entry = self.entries.get(file.name)
+        if (
+            entry is None
+            or entry["published"] != published
+            or entry.get("settings", "") != self.settings
+        ):
+            return False
+
+        key = stat_key(file)
+        if key != entry["stat"]:
+            if file_hash(file) != entry["source"]:
+                return False
+            with self._lock:
+                entry["stat"] = key
+                self._dirty = True
+
+        return self._images_unchanged(file, entry["images"])
+
+    def post_unchanged(self, file: Path, digest: str) -> bool:
+        entry = self.entries.get(file.name)
+        return entry is not None and entry["post"] == digest
+
+    def record(
+        self,
+        file: Path,
+        post_digest: str,
+        published: bool,
+        source: list,
+        images: dict[str, list],
+    ):
+        # the states are those of the bytes that were converted and uploaded,
+        # not of whatever is on disk by the time the posts are written
+        *stat, digest = source
+        entry = {
+            "stat": stat,
+            "source": digest,
+            "published": published,
+            "settings": self.settings,
+            "post": post_digest,
+            "images": images,
+        }
+        with self._lock:
+            self.entries[file.name] = entry
+            self._dirty = True
+
+    def discard(self, file: Path):
+        with self._lock:
+            if self.entries.pop(file.name, None) is not None:
+                self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_bytes(orjson.dumps(self.entries, option=orjson.OPT_INDENT_2))
+            tmp.replace(self.path)
+            self._dirty = False
+
+
+class ManifestSet:
+    def __init__(self, settings: str = ""):
+        self.settings = settings
+        self._manifests: dict[Path, Manifest] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, file: Path) -> Manifest:
+        directory = file.parent.resolve()
+        with self._lock:
+            if directory not in self._manifests:
+                self._manifests[directory] = Manifest(directory, self.settings)
+            return self._manifests[directory]
+
+    def save(self):
+        for manifest in self._manifests.values():
+            manifest.save()
@@ -0,0 +1,80 @@
+import logging
+from typing import Callable
+
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReplaceOne
+from pymongo.database import Database
+
+from blog_uploader.image_uploaders.registry import IMAGE_INDEXES, link_posts
+from blog_uploader.schemas import PostSummary
+
+__all__ = [
+    "LISTING_INDEXES",
+    "MIGRATIONS",
+    "backfill_image_references",
+    "backfill_summaries",
+    "migrate",
+]
+
+logger = logging.getLogger(__name__)
+
+# listing queries filter on published and tags and sort by date, on both the
+# full posts and their summaries
+LISTING_INDEXES = [
+    IndexModel([("published", ASCENDING), ("created", DESCENDING)]),
+    IndexModel([("published", ASCENDING), ("updated", DESCENDING)]),
+    IndexModel(
+        [("tags", ASCENDING), ("published", ASCENDING), ("created", DESCENDING)]
+    ),
+]
+
+SCHEMA_ID = "schema"
+BATCH_SIZE = 1000
+
+
+def create_listing_indexes(db: Database) -> None:
+    db.posts.create_indexes(LISTING_INDEXES)
+    db.post_summaries.create_indexes(LISTING_INDEXES)
+
+
+def backfill_summaries(db: Database) -> None:
+    projection = dict.fromkeys(PostSummary.__fields__.keys() - {"id"}, 1)
+
+    ops = []
+    for doc in db.posts.find({}, projection):
+        ops.append(ReplaceOne({"_id": doc["_id"]}, doc, upsert=True))
+        if len(ops) >= BATCH_SIZE:
+            db.post_summaries.bulk_write(ops, ordered=False)
+            ops.clear()
+    if ops:
+        db.post_summaries.bulk_write(ops, ordered=False)
+
+
+def create_image_indexes(db: Database) -> None:
+    db.images.create_indexes(IMAGE_INDEXES)
+
+
+def backfill_image_references(db: Database) -> None:
+    link_posts(db.posts, db.images)
+
+
+MIGRATIONS: list[Callable[[Database], None]] = [
+    create_listing_indexes,
+    backfill_summaries,
+    create_image_indexes,
+    backfill_image_references,
+]
+
+
+def migrate(db: Database) -> list[str]:
+    state = db.migrations.find_one({"_id": SCHEMA_ID}) or {}
+    version = state.get("version", 0)
+
+    applied = []
+    for number, migration in enumerate(MIGRATIONS[version:], version + 1):
+        logger.info("applying migration %d: %s", number, migration.__name__)
+        migration(db)
+        db.migrations.update_one(
+            {"_id": SCHEMA_ID}, {"$set": {"version": number}}, upsert=True
+        )
+        applied.append(migration.__name__)
+    return applied
@@ -0,0 +1,307 @@
+import abc
+import logging
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import threading
+import time
+from contextlib import AbstractContextManager, contextmanager
+from typing import Iterator, Optional
+
+import orjson
+
+from blog_uploader.exceptions import PostException
+
+__all__ = [
+    "PandocBackend",
+    "SubprocessBackend",
+    "ServerBackend",
+    "PandocServerUnavailable",
+    "create_backend",
+    "get_backend",
+    "set_backend",
+    "use_backend",
+]
+
+logger = logging.getLogger(__name__)
+
+
+class PandocServerUnavailable(Exception):
+    pass
+
+
+class PandocBackend(AbstractContextManager):
+    @abc.abstractmethod
+    def convert(
+        self,
+        source: bytes,
+        from_format: str,
+        to_format: str,
+        *,
+        highlight: bool = True,
+    ) -> bytes:
+        ...
+
+    def close(self) -> None:
+        ...
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class SubprocessBackend(PandocBackend):
+    def __init__(self, executable: str = "pandoc"):
+        self.executable = executable
+
+    def convert(self, source, from_format, to_format, *, highlight=True):
+        args = [self.executable, "-f", from_format, "-t", to_format]
+        if not highlight:
+            args.insert(1, "--no-highlight")
+
+        with subprocess.Popen(
+            args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        ) as p:
+            output, error = p.communicate(source)
+            if p.returncode != 0:
+                raise PostException(error)
+            return output
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class _ServerWorker:
+    STARTUP_TIMEOUT = 10.0
+
+    def __init__(self, executable: str, timeout: int):
+        self.executable = executable
+        self.timeout = timeout
+        # requests is only needed once a server is started, so it stays out of
+        # the import path of commands that never convert anything
+        import requests
+
+        self.session = requests.Session()
+        self.process: Optional[subprocess.Popen] = None
+        self.url = ""
+        self.checked = 0.0
+        self.start()
+
+    def start(self):
+        port = _free_port()
+        self.url = f"http://127.0.0.1:{port}/"
+        self.process = subprocess.Popen(
+            [
+                self.executable,
+                "server",
+                "--port",
+                str(port),
+                "--timeout",
+                str(self.timeout),
+            ],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+        deadline = time.monotonic() + self.STARTUP_TIMEOUT
+        while not self.healthy():
+            if self.process.poll() is not None or time.monotonic() > deadline:
+                self.stop()
+                raise PandocServerUnavailable(f"{self.executable} server did not start")
+            time.sleep(0.05)
+        self.checked = time.monotonic()
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+    def restart(self):
+        logger.warning("restarting pandoc server at %s", self.url)
+        self.stop()
+        self.start()
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def healthy(self) -> bool:
+        if not self.running:
+            return False
+        try:
+            return self.session.get(self.url + "version", timeout=1).ok
+        except OSError:  # requests.RequestException
+            return False
+
+    def convert(self, source: bytes, from_format, to_format, *, highlight=True):
+        body = {"text": source.decode(), "from": from_format, "to": to_format}
+        if not highlight:
+            body["highlight-style"] = None
+
+        resp = self.session.post(
+            self.url,
+            data=orjson.dumps(body),
+            headers={"Accept": "application/json", "Content-Type": "application/json"},
+            timeout=self.timeout,
+        )
+        if not resp.ok:
+            raise PostException(
+                f"pandoc server returned {resp.status_code}: {resp.text[:200]}"
+            )
+        result = orjson.loads(resp.content)
+
+        if "error" in result:
+            raise PostException(result["error"])
+
+        return result["output"].encode()
+
+
+class ServerBackend(PandocBackend):
+    HEALTH_CHECK_INTERVAL = 30.0
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        *,
+        executable: str = "pandoc",
+        timeout: int = 60,
+    ):
+        self.executable = executable
+        self.timeout = timeout
+        self.max_workers = workers or os.cpu_count() or 1
+        self._workers: list[_ServerWorker] = []
+        self._idle: queue.SimpleQueue[_ServerWorker] = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._started = 1
+        # used once a server dies and cannot be started again
+        self._fallback = SubprocessBackend(executable)
+
+        # one server starts now, so a pandoc without server support falls back
+        # to subprocesses straight away; the others start when conversions
+        # overlap, alongside each other instead of one after another
+        worker = _ServerWorker(executable, timeout)
+        self._workers.append(worker)
+        self._idle.put(worker)
+
+    def _spawn(self) -> Optional[_ServerWorker]:
+        with self._lock:
+            if self._started >= self.max_workers:
+                return None
+            self._started += 1
+
+        try:
+            worker = _ServerWorker(self.executable, self.timeout)
+        except PandocServerUnavailable:
+            with self._lock:
+                self._started -= 1
+                self.max_workers = self._started
+            logger.warning("pandoc server did not start, keeping %d", self.max_workers)
+            return None
+
+        with self._lock:
+            self._workers.append(worker)
+        return worker
+
+    def _checkout(self) -> _ServerWorker:
+        try:
+            worker = self._idle.get_nowait()
+        except queue.Empty:
+            worker = self._spawn() or self._idle.get()
+
+        try:
+            if not worker.running or (
+                time.monotonic() - worker.checked > self.HEALTH_CHECK_INTERVAL
+                and not worker.healthy()
+            ):
+                worker.restart()
+        except PandocServerUnavailable:
+            self._idle.put(worker)
+            raise
+        return worker
+
+    def convert(self, source, from_format, to_format, *, highlight=True):
+        # already imported by the servers, so this costs nothing here
+        import requests
+
+        try:
+            worker = self._checkout()
+        except PandocServerUnavailable:
+            pass
+        else:
+            try:
+                try:
+                    return worker.convert(
+                        source, from_format, to_format, highlight=highlight
+                    )
+                except requests.ConnectionError:
+                    # only a server that stopped answering is restarted, an
+                    # error response is the conversion's own failure
+                    worker.restart()
+                    return worker.convert(
+                        source, from_format, to_format, highlight=highlight
+                    )
+            except PandocServerUnavailable:
+                pass
+            finally:
+                worker.checked = time.monotonic()
+                self._idle.put(worker)
+
+        logger.warning("pandoc server did not restart, running pandoc instead")
+        return self._fallback.convert(
+            source, from_format, to_format, highlight=highlight
+        )
+
+    def close(self):
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            worker.stop()
+            worker.session.close()
+
+
+def create_backend(workers: int = 0, executable: str = "pandoc") -> PandocBackend:
+    if workers > 0 and shutil.which(executable) is not None:
+        try:
+            return ServerBackend(workers, executable=executable)
+        except PandocServerUnavailable:
+            logger.warning("pandoc server unavailable, running pandoc per conversion")
+    return SubprocessBackend(executable)
+
+
+_backend: PandocBackend = SubprocessBackend()
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> PandocBackend:
+    return _backend
+
+
+def set_backend(backend: PandocBackend) -> PandocBackend:
+    global _backend
+
+    with _backend_lock:
+        previous, _backend = _backend, backend
+    return previous
+
+
+@contextmanager
+def use_backend(backend: PandocBackend) -> Iterator[PandocBackend]:
+    # conversions after the block must not reach a backend that is closed
+    previous = set_backend(backend)
+    try:
+        with backend:
+            yield backend
+    finally:
+        set_backend(previous)
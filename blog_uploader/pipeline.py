@@ -0,0 +1,145 @@
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Container, Optional, Sequence
+
+__all__ = ["FilterPipeline", "filter_settings", "warn"]
+
+_running: ContextVar[Optional["FilterPipeline"]] = ContextVar(
+    "blog_uploader_pipeline", default=None
+)
+
+
+def _filter_name(action: Callable) -> str:
+    return getattr(action, "__name__", type(action).__name__)
+
+
+def filter_settings(filters: Sequence[Callable]) -> list:
+    # a filter describes how it converts through `settings`, others are only
+    # told apart by name
+    return [getattr(f, "settings", None) or _filter_name(f) for f in filters]
+
+
+def warn(message: str) -> None:
+    # filters are shared between posts, so a problem is reported against the
+    # pipeline that is walking the post it came from
+    pipeline = _running.get()
+    if pipeline is not None:
+        pipeline.warnings.append(message)
+
+
+class FilterPipeline:
+    def __init__(self, filters: Sequence[Callable] = ()):
+        self.filters = list(filters)
+        self.names = list(map(_filter_name, self.filters))
+        self.timings = [0.0] * len(self.filters)
+        self.calls = [0] * len(self.filters)
+        self.modified = False
+        self.warnings: list[str] = []
+        self.format = ""
+        self.meta: Any = None
+
+        self._dispatch: dict[str, list[int]] = {}
+        # filters without node_types see every node
+        self._node_types: list[Optional[Container[str]]] = [
+            getattr(f, "node_types", None) for f in self.filters
+        ]
+
+    def _for_type(self, node_type: str) -> list[int]:
+        indices = self._dispatch.get(node_type)
+        if indices is None:
+            indices = self._dispatch[node_type] = [
+                i
+                for i, types in enumerate(self._node_types)
+                if types is None or node_type in types
+            ]
+        return indices
+
+    def prepare(self, doc: dict) -> None:
+        for i, f in enumerate(self.filters):
+            prepare = getattr(f, "prepare", None)
+            if prepare is not None:
+                start = time.perf_counter()
+                prepare(doc)
+                self.timings[i] += time.perf_counter() - start
+
+    def run(self, doc: dict, format: str = "", meta: Any = None) -> dict:
+        self.format = format
+        self.meta = doc.get("meta") if meta is None else meta
+        if self.filters:
+            token = _running.set(self)
+            try:
+                self._walk(doc, 0, len(self.filters))
+            finally:
+                _running.reset(token)
+        return doc
+
+    def __call__(self, doc: dict, format: str = "", meta: Any = None) -> dict:
+        self.prepare(doc)
+        return self.run(doc, format, meta)
+
+    def report(self) -> dict[str, float]:
+        report: dict[str, float] = {}
+        for name, seconds in zip(self.names, self.timings):
+            report[name] = report.get(name, 0.0) + seconds
+        return report
+
+    # matches running pandocfilters.walk once per filter: a filter only sees a
+    # node after the filters before it are done with the node's subtree, so
+    # the children are walked once per run of filters between the node's
+    # handlers, and a replacement's children are walked by the filter that
+    # made it before the later filters see the replacement
+    def _apply(self, node: dict, lo: int, hi: int) -> Optional[list]:
+        walked = lo
+        for i in self._for_type(node["t"]):
+            if i < lo:
+                continue
+            if i >= hi:
+                break
+            if walked < i:
+                self._walk(node, walked, i)
+                walked = i
+
+            t = time.perf_counter()
+            result = self.filters[i](node["t"], node.get("c"), self.format, self.meta)
+            self.timings[i] += time.perf_counter() - t
+            self.calls[i] += 1
+
+            if result is None:
+                continue
+
+            self.modified = True
+            replacement = []
+            for z in result if isinstance(result, list) else [result]:
+                self._walk(z, i, i + 1)
+                if isinstance(z, dict) and "t" in z:
+                    nodes = self._apply(z, i + 1, hi)
+                    if nodes is not None:
+                        replacement.extend(nodes)
+                        continue
+                elif i + 1 < hi:
+                    self._walk(z, i + 1, hi)
+                replacement.append(z)
+            return replacement
+
+        if walked < hi:
+            self._walk(node, walked, hi)
+        return None
+
+    def _walk(self, x: Any, lo: int, hi: int) -> None:
+        if isinstance(x, list):
+            i = 0
+            while i < len(x):
+                item = x[i]
+                if isinstance(item, dict) and "t" in item:
+                    replacement = self._apply(item, lo, hi)
+                    if replacement is not None:
+                        x[i : i + 1] = replacement
+                        i += len(replacement)
+                        continue
+                else:
+                    self._walk(item, lo, hi)
+                i += 1
+        elif isinstance(x, dict):
+            for v in x.values():
+                if isinstance(v, (list, dict)):
+                    self._walk(v, lo, hi)
@@ -0,0 +1,179 @@
+import cProfile
+import functools
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+__all__ = [
+    "Profile",
+    "bind",
+    "count",
+    "disable",
+    "enable",
+    "is_enabled",
+    "profile",
+    "profile_threads",
+    "record",
+    "span",
+]
+
+T = TypeVar("T")
+
+_enabled = False
+_current: ContextVar[Optional["Profile"]] = ContextVar(
+    "blog_uploader_profile", default=None
+)
+_NOOP = nullcontext()
+
+
+class Profile:
+    def __init__(self, name: str):
+        self.name = name
+        self.spans: dict[str, list] = {}
+        self.counters: dict[str, int] = {}
+        self.wall = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float, calls: int = 1) -> None:
+        with self._lock:
+            entry = self.spans.setdefault(name, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += calls
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def to_dict(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "wall": self.wall,
+                "spans": {
+                    name: {"seconds": seconds, "calls": calls}
+                    for name, (seconds, calls) in sorted(self.spans.items())
+                },
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+@contextmanager
+def profile(name: str) -> Iterator[Optional[Profile]]:
+    if not _enabled:
+        yield None
+        return
+
+    current = Profile(name)
+    token = _current.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.wall = time.perf_counter() - start
+        _current.reset(token)
+
+
+@contextmanager
+def _span(current: Profile, name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current.add(name, time.perf_counter() - start)
+
+
+def span(name: str):
+    # a disabled profiler costs one global lookup per span
+    if not _enabled:
+        return _NOOP
+    current = _current.get()
+    if current is None:
+        return _NOOP
+    return _span(current, name)
+
+
+def count(name: str, n: int = 1) -> None:
+    if _enabled:
+        current = _current.get()
+        if current is not None:
+            current.count(name, n)
+
+
+def record(name: str, seconds: float, calls: int = 1) -> None:
+    if _enabled:
+        current = _current.get()
+        if current is not None:
+            current.add(name, seconds, calls)
+
+
+def bind(fn: Callable[..., T]) -> Callable[..., T]:
+    # executor threads do not inherit context variables, so carry the active
+    # profile over to whichever thread runs fn
+    if not _enabled:
+        return fn
+    current = _current.get()
+    if current is None:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _current.set(current)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+
+    return wrapper
+
+
+@contextmanager
+def profile_threads(path: str) -> Iterator[None]:
+    profiles = [cProfile.Profile()]
+
+    # before 3.12 cProfile only sees the thread that enabled it, so every
+    # thread started meanwhile gets a profiler of its own
+    per_thread = sys.version_info < (3, 12)
+    if per_thread:
+        lock = threading.Lock()
+
+        def start(*_):
+            p = cProfile.Profile()
+            with lock:
+                profiles.append(p)
+            p.enable()
+
+        threading.setprofile(start)
+
+    profiles[0].enable()
+    try:
+        yield
+    finally:
+        profiles[0].disable()
+        if per_thread:
+            threading.setprofile(None)
+        stats = pstats.Stats(profiles[0])
+        for p in profiles[1:]:
+            p.disable()
+            try:
+                stats.add(p)
+            except TypeError:  # the thread never ran any Python code
+                pass
+        stats.dump_stats(path)
@@ -1,9 +1,8 @@
-from enum import Enum
+from datetime import datetime
 from typing import Callable, Iterable, Optional, Union
 
 from bson.objectid import ObjectId as _ObjectId
-from pendulum import DateTime
-from pydantic import AnyHttpUrl, BaseModel, Extra, Field, FilePath
+from pydantic import AnyHttpUrl, BaseModel, Extra, Field
 
 
 class ObjectId(_ObjectId):
@@ -25,22 +24,35 @@ class MongoModel(BaseModel):
         allow_population_by_field_name = True
 
 
-class Post(MongoModel):
+class PostSummary(MongoModel):
     title: str
-    created: DateTime
-    updated: DateTime
+    created: datetime
+    updated: datetime
     image: Optional[AnyHttpUrl]
     summary: Optional[str]
-    body: str
     published: bool = False
     tags: list[str]
 
 
-class Image(MongoModel):
-    path: FilePath
-    url: AnyHttpUrl
-    delete_key: str
-    post_id: Optional[ObjectId]
+class Post(PostSummary):
+    body: str
+
+    def to_summary(self) -> PostSummary:
+        return PostSummary(**self.dict(include=set(PostSummary.__fields__)))
+
+
+class Image(BaseModel):
+    # sha256 of the content, so each blob is registered once whatever its name
+    id: str = Field(alias="_id")
+    url: str
+    delete_key: Optional[str]
+    size: int
+    posts: list[ObjectId] = Field(default_factory=list)
+    created: datetime
+    released: datetime
+
+    class Config:
+        allow_population_by_field_name = True
 
 
 class Metadata(BaseModel):
@@ -51,13 +63,3 @@ class Metadata(BaseModel):
 
     class Config:
         extra = Extra.allow
-
-
-class Action(str, Enum):
-    create = "create"
-    upload = "upload"
-    publish = "publish"
-    delete = "delete"
-
-    def __str__(self):
-        return self.value
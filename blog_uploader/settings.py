@@ -1,4 +1,7 @@
-from typing import Optional
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Optional
 
 from pydantic import AnyUrl, BaseSettings, SecretStr
 
@@ -20,4 +23,19 @@ class Settings(BaseSettings):
         env_file = ".env"
 
 
-settings = Settings()
+def cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "blog_uploader"
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    return Settings()
+
+
+def __getattr__(name: str) -> Any:
+    # `settings` is read from the environment on first use so commands that
+    # never touch Mongo do not require MONGODB_URI
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
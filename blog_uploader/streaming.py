@@ -0,0 +1,248 @@
+import re
+import subprocess
+import tempfile
+import threading
+from contextlib import ExitStack
+from pathlib import Path
+from typing import IO, Any, Iterator, Optional
+
+import orjson
+from pandocfilters import stringify
+
+from blog_uploader.exceptions import PostException
+from blog_uploader.pipeline import FilterPipeline
+
+__all__ = ["iter_document", "render_streaming"]
+
+CHUNK_SIZE = 1 << 16
+BATCH_BLOCKS = 64
+
+_STRUCTURAL = re.compile(rb'["\[\]{}]')
+_STRING_END = re.compile(rb'["\\]')
+_SCALAR_END = re.compile(rb"[,}\]\s]")
+_WHITESPACE = b" \t\r\n"
+
+
+class _Scanner:
+    def __init__(self, stream: IO[bytes], chunk_size: int = CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+        self.pos = 0
+
+    def _fill(self, keep: int) -> int:
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            raise PostException("unexpected end of pandoc output")
+        del self.buffer[:keep]
+        self.buffer += chunk
+        return keep
+
+    def peek(self) -> int:
+        while True:
+            while self.pos < len(self.buffer):
+                c = self.buffer[self.pos]
+                if c not in _WHITESPACE:
+                    return c
+                self.pos += 1
+            self.pos -= self._fill(self.pos)
+
+    def expect(self, char: bytes) -> None:
+        if self.peek() != char[0]:
+            raise PostException(f"malformed pandoc output, expected {char!r}")
+        self.pos += 1
+
+    def value(self) -> bytes:
+        if self.peek() not in b'{["':
+            return self._scalar()
+
+        begin = i = self.pos
+        depth = 0
+        in_string = False
+        while True:
+            m = (_STRING_END if in_string else _STRUCTURAL).search(self.buffer, i)
+            if m is None or (
+                in_string and m.group() == b"\\" and m.end() >= len(self.buffer)
+            ):
+                # keep the partial value and resume scanning where we stopped
+                resume = len(self.buffer) if m is None else m.start()
+                shift = self._fill(begin)
+                begin, i = begin - shift, resume - shift
+                continue
+
+            c = m.group()
+            i = m.end()
+            if in_string:
+                if c == b"\\":
+                    i += 1
+                else:
+                    in_string = False
+                    if depth == 0:
+                        break
+            elif c == b'"':
+                in_string = True
+            elif c in b"[{":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    break
+
+        self.pos = i
+        return bytes(self.buffer[begin:i])
+
+    def _scalar(self) -> bytes:
+        begin = self.pos
+        while (m := _SCALAR_END.search(self.buffer, begin)) is None:
+            begin -= self._fill(begin)
+        self.pos = m.start()
+        return bytes(self.buffer[begin : m.start()])
+
+    def separator(self, close: bytes) -> bool:
+        c = self.peek()
+        self.pos += 1
+        if c == close[0]:
+            return False
+        if c != ord(","):
+            raise PostException("malformed pandoc output")
+        return True
+
+
+def iter_document(stream: IO[bytes]) -> Iterator[tuple[str, Any]]:
+    scanner = _Scanner(stream)
+    scanner.expect(b"{")
+
+    more = True
+    while more:
+        key = orjson.loads(scanner.value())
+        scanner.expect(b":")
+
+        if key == "blocks":
+            scanner.expect(b"[")
+            if scanner.peek() == ord("]"):
+                scanner.pos += 1
+            else:
+                more_blocks = True
+                while more_blocks:
+                    yield key, orjson.loads(scanner.value())
+                    more_blocks = scanner.separator(b"]")
+        else:
+            yield key, orjson.loads(scanner.value())
+
+        more = scanner.separator(b"}")
+
+
+def _check(p: subprocess.Popen, stderr: IO[bytes]) -> None:
+    if p.wait() != 0:
+        stderr.seek(0)
+        raise PostException(stderr.read())
+
+
+class _Writer:
+    def __init__(self, executable: str, stack: ExitStack, header: dict):
+        self.stderr = stack.enter_context(tempfile.TemporaryFile())
+        self.process = stack.enter_context(
+            subprocess.Popen(
+                [executable, "-f", "json", "-t", "gfm"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=self.stderr,
+            )
+        )
+        stack.callback(self.process.kill)
+        # both are pipes, which Popen only types as optional
+        assert self.process.stdin is not None and self.process.stdout is not None
+        self.stdin = self.process.stdin
+        stdout = self.process.stdout
+
+        self.output: list[bytes] = []
+        self._drain = threading.Thread(
+            target=lambda: self.output.extend(
+                iter(lambda: stdout.read(CHUNK_SIZE), b"")
+            )
+        )
+        self._drain.start()
+        self._separator = b""
+
+        self._write(
+            b'{"pandoc-api-version":'
+            + orjson.dumps(header.get("pandoc-api-version"))
+            + b',"meta":'
+            + orjson.dumps(header.get("meta", {}))
+            + b',"blocks":['
+        )
+
+    def _write(self, data: bytes) -> None:
+        try:
+            self.stdin.write(data)
+        except BrokenPipeError:
+            _check(self.process, self.stderr)
+            raise
+
+    def write_blocks(self, blocks: list) -> None:
+        for block in blocks:
+            self._write(self._separator + orjson.dumps(block))
+            self._separator = b","
+
+    def finish(self) -> str:
+        self._write(b"]}")
+        self.stdin.close()
+        self._drain.join()
+        _check(self.process, self.stderr)
+        return b"".join(self.output).decode()
+
+
+def render_streaming(
+    file: Path,
+    pipeline: FilterPipeline,
+    *,
+    executable: str = "pandoc",
+    batch_blocks: int = BATCH_BLOCKS,
+) -> tuple[dict, str, str]:
+    with ExitStack() as stack:
+        source = stack.enter_context(open(file, "rb"))
+        reader_err = stack.enter_context(tempfile.TemporaryFile())
+        reader = stack.enter_context(
+            subprocess.Popen(
+                [executable, "--no-highlight", "-f", "gfm", "-t", "json"],
+                stdin=source,
+                stdout=subprocess.PIPE,
+                stderr=reader_err,
+            )
+        )
+        stack.callback(reader.kill)
+        assert reader.stdout is not None
+
+        header: dict[str, Any] = {}
+        title: Optional[str] = None
+        writer: Optional[_Writer] = None
+        pending: list[dict] = []
+
+        def flush(writer: _Writer) -> None:
+            # filters see a window of blocks, so prepare hooks still batch work
+            doc = {"blocks": pending[:]}
+            pending.clear()
+            pipeline(doc, meta=header.get("meta"))
+            writer.write_blocks(doc["blocks"])
+
+        for key, value in iter_document(reader.stdout):
+            if key != "blocks":
+                header[key] = value
+            elif writer is None:
+                match value:
+                    case {"t": "Header", "c": [1, _, _]}:
+                        title = stringify(value)
+                    case _:
+                        raise PostException("No title")
+                writer = _Writer(executable, stack, header)
+            else:
+                pending.append(value)
+                if len(pending) >= batch_blocks:
+                    flush(writer)
+
+        _check(reader, reader_err)
+        if writer is None or title is None:
+            raise PostException("No title")
+
+        flush(writer)
+        return header.get("meta", {}), title, writer.finish()
@@ -0,0 +1,239 @@
+import abc
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
+
+from blog_uploader.batch import MARKDOWN_SUFFIXES, UploadReport
+
+__all__ = [
+    "InotifyWatcher",
+    "PollingWatcher",
+    "Watcher",
+    "create_watcher",
+    "iter_changes",
+    "watch",
+]
+
+logger = logging.getLogger(__name__)
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+
+_EVENT = struct.Struct("iIII")
+
+
+def _is_post(path: Path) -> bool:
+    return path.suffix in MARKDOWN_SUFFIXES and not path.name.startswith(".")
+
+
+class Watcher(abc.ABC):
+    @abc.abstractmethod
+    def read(self, timeout: Optional[float] = None) -> Optional[set[Path]]:
+        ...
+
+    def close(self) -> None:
+        ...
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class PollingWatcher(Watcher):
+    def __init__(self, directories: Iterable[Path], *, interval: float = 1.0):
+        self.directories = list(directories)
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def _scan(self) -> dict[Path, tuple[int, int]]:
+        snapshot = {}
+        for directory in self.directories:
+            for root, dirs, files in os.walk(directory):
+                dirs[:] = [d for d in dirs if not d.startswith(".")]
+                for name in files:
+                    path = Path(root, name)
+                    if _is_post(path):
+                        try:
+                            s = path.stat()
+                        except FileNotFoundError:
+                            continue
+                        snapshot[path] = (s.st_mtime_ns, s.st_size)
+        return snapshot
+
+    def read(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.interval
+            if deadline is not None:
+                wait = min(wait, max(deadline - time.monotonic(), 0))
+            time.sleep(wait)
+
+            snapshot = self._scan()
+            changed = {
+                path
+                for path, stat in snapshot.items()
+                if self.snapshot.get(path) != stat
+            }
+            self.snapshot = snapshot
+
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+
+
+class InotifyWatcher(Watcher):
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    def __init__(self, directories: Iterable[Path]):
+        libc_name = ctypes.util.find_library("c")
+        if not sys.platform.startswith("linux") or libc_name is None:
+            raise OSError("inotify is not available")
+
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self.directories = list(directories)
+        self._watches: dict[int, Path] = {}
+        for directory in self.directories:
+            self._add_tree(directory)
+
+    def _add(self, directory: Path) -> None:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"cannot watch {directory}")
+        self._watches[wd] = directory
+
+    def _add_tree(self, directory: Path) -> None:
+        for root, dirs, _ in os.walk(directory):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            self._add(Path(root))
+
+    def _rescan(self) -> set[Path]:
+        # the kernel queue overflowed, so any post could have changed
+        changed: set[Path] = set()
+        for directory in self.directories:
+            for root, dirs, files in os.walk(directory):
+                dirs[:] = [d for d in dirs if not d.startswith(".")]
+                changed.update(
+                    p for p in map(Path(root).joinpath, files) if _is_post(p)
+                )
+        return changed
+
+    def read(self, timeout=None):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return None
+
+        changed: set[Path] = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+                offset += length
+
+                if mask & IN_Q_OVERFLOW:
+                    changed |= self._rescan()
+                    continue
+
+                directory = self._watches.get(wd)
+                if directory is None:
+                    continue
+                path = directory / name
+
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO) and not name.startswith("."):
+                        try:
+                            self._add_tree(path)
+                        except OSError as e:
+                            logger.warning("cannot watch %s: %s", path, e)
+                            continue
+                        changed.update(p for p in path.rglob("*") if _is_post(p))
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and _is_post(path):
+                    changed.add(path)
+
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def create_watcher(directories: Iterable[Path], *, poll: bool = False) -> Watcher:
+    directories = list(directories)
+    if not poll:
+        try:
+            return InotifyWatcher(directories)
+        except OSError as e:
+            logger.warning("inotify unavailable (%s), polling for changes", e)
+    return PollingWatcher(directories)
+
+
+def iter_changes(watcher: Watcher, *, debounce: float = 0.3) -> Iterator[set[Path]]:
+    while True:
+        changed = watcher.read() or set()
+        # editors often write a file several times per save, so wait until
+        # the tree has been quiet for a moment
+        while (more := watcher.read(debounce)) is not None:
+            changed |= more
+
+        changed = {path for path in changed if path.is_file()}
+        if changed:
+            yield changed
+
+
+def watch(
+    directories: Iterable[Path],
+    upload: Callable[[list[Path]], UploadReport],
+    *,
+    debounce: float = 0.3,
+    poll: bool = False,
+) -> None:
+    with create_watcher(directories, poll=poll) as watcher:
+        for changed in iter_changes(watcher, debounce=debounce):
+            saved = {}
+            for path in changed:
+                try:
+                    saved[path] = path.stat().st_mtime
+                except FileNotFoundError:
+                    pass
+
+            try:
+                report = upload(list(saved))
+            except Exception:
+                logger.exception("upload of %s failed", ", ".join(map(str, saved)))
+                continue
+
+            live = time.time()
+            for result in report.results:
+                if result.error is not None:
+                    logger.error("%s: failed (%r)", result.path, result.error)
+                else:
+                    logger.info(
+                        "%s: %s, live %.3fs after save",
+                        result.path,
+                        result.status,
+                        live - saved[result.path],
+                    )
+                for warning in result.warnings:
+                    logger.warning("%s: %s", result.path, warning)
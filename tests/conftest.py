@@ -0,0 +1,16 @@
+import pytest
+
+from benchmarks.standins import mongo_database, s3_client
+
+
+@pytest.fixture
+def db():
+    with mongo_database() as database:
+        yield database
+        database.client.drop_database(database.name)
+
+
+@pytest.fixture
+def s3():
+    with s3_client("blog-uploader-test") as client:
+        yield client
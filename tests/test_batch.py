@@ -0,0 +1,75 @@
+import re
+
+import orjson
+import pytest
+
+from blog_uploader.batch import UploadStatus, upload_posts
+from blog_uploader.image_uploaders.directory_uploader import DirectoryUploader
+from blog_uploader.pandoc import PandocBackend, use_backend
+from blog_uploader.schemas import ObjectId
+
+IMAGE_RE = re.compile(r"!\[\]\(([^)]+)\)")
+
+
+def _inlines(text: str) -> dict:
+    return {"t": "MetaInlines", "c": [{"t": "Str", "c": text}]}
+
+
+class StubBackend(PandocBackend):
+    # turns "<id>\n# <title>\n![](<image>)..." into the AST pandoc would give
+    def convert(self, source, from_format, to_format, *, highlight=True):
+        if from_format == "json":
+            return b"body\n"
+
+        post_id, title, *rest = source.decode().splitlines()
+        images = IMAGE_RE.findall("\n".join(rest))
+        return orjson.dumps(
+            {
+                "pandoc-api-version": [1, 23],
+                "meta": {"id": _inlines(post_id)},
+                "blocks": [
+                    {"t": "Header", "c": [1, ["", [], []], [{"t": "Str", "c": title}]]},
+                    {
+                        "t": "Para",
+                        "c": [
+                            {"t": "Image", "c": [["", [], []], [], [name, ""]]}
+                            for name in images
+                        ],
+                    },
+                ],
+            }
+        )
+
+
+class FailingUploader(DirectoryUploader):
+    def upload(self, file):
+        if file.name.endswith("bad.png"):
+            raise RuntimeError("upload rejected")
+        return super().upload(file)
+
+
+@pytest.fixture
+def posts(tmp_path):
+    paths = []
+    for name in ("good", "bad"):
+        (tmp_path / f"{name}.png").write_bytes(b"\x89PNG " + name.encode())
+        path = tmp_path / f"{name}.md"
+        path.write_text(f"{ObjectId()}\n{name.title()}\n![]({name}.png)\n")
+        paths.append(path)
+    return paths
+
+
+def test_unexpected_error_fails_only_its_post(db, tmp_path, posts):
+    good, bad = posts
+    uploader = FailingUploader(tmp_path / "uploaded")
+
+    with use_backend(StubBackend()):
+        report = upload_posts(posts, db, uploader)
+
+    results = {r.path: r for r in report.results}
+    assert results[good].status == UploadStatus.uploaded
+    assert results[bad].status == UploadStatus.failed
+    assert isinstance(results[bad].error, RuntimeError)
+
+    assert [p["title"] for p in db.posts.find()] == ["Good"]
+    assert report.written == 1
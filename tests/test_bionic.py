@@ -0,0 +1,63 @@
+import pytest
+import requests
+
+from benchmarks.bench_bionic_html import recorded_response
+from blog_uploader.bionic import BionicBase, BionicException, clean_html
+
+
+class StubBionic(BionicBase):
+    backoff = 0
+
+    def __init__(self, status: int, content: bytes):
+        super().__init__()
+        self.status = status
+        self.content = content
+
+    def convert(self, value):
+        resp = requests.Response()
+        resp.status_code = self.status
+        resp._content = self.content
+        return resp
+
+
+def doc(text: str) -> dict:
+    return {"blocks": [{"t": "Plain", "c": [{"t": "Str", "c": text}]}]}
+
+
+def test_clean_html():
+    assert clean_html(recorded_response(3)).count('class="b bionic"') == 3
+
+
+@pytest.mark.parametrize("content", [b"", b'{"message": "Invalid API key"}'])
+def test_clean_html_rejects_non_html(content):
+    with pytest.raises(BionicException):
+        clean_html(content)
+
+
+@pytest.mark.parametrize("status", [401, 403, 500])
+def test_error_response_is_a_failed_conversion(status):
+    bionic = StubBionic(status, b'{"message": "Invalid API key"}')
+
+    bionic.prepare(doc("hello"))
+
+    assert "hello" in bionic._failed
+    assert bionic._convert_text("hello") is None
+
+
+def test_ok_response_is_converted():
+    bionic = StubBionic(200, recorded_response(1))
+
+    bionic.prepare(doc("hello"))
+
+    assert bionic._failed == {}
+    assert "bionic" in bionic._converted["hello"]
+
+
+def test_memo_keeps_the_latest_texts():
+    bionic = StubBionic(200, recorded_response(1))
+    bionic.memo_size = 2
+
+    for text in ("a", "b", "a", "c"):
+        bionic.prepare(doc(text))
+
+    assert list(bionic._converted) == ["a", "c"]
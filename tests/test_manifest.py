@@ -0,0 +1,159 @@
+import os
+
+import pytest
+
+from blog_uploader.batch import conversion_settings
+from blog_uploader.bionic import Bionic
+from blog_uploader.image_uploaders.optimizer import ImageOptimizer
+from blog_uploader.manifest import (
+    Manifest,
+    ManifestSet,
+    file_state,
+    is_current,
+    read_source,
+)
+
+
+@pytest.fixture
+def post(tmp_path):
+    (tmp_path / "a.png").write_bytes(b"\x89PNG image")
+    path = tmp_path / "post.md"
+    path.write_text("# Title\n\n![a](a.png)\n")
+    return path
+
+
+def record(manifest: Manifest, post, state=None, published=False):
+    manifest.record(
+        post,
+        "digest",
+        published,
+        state or file_state(post),
+        {"a.png": file_state(post.parent / "a.png")},
+    )
+
+
+def touch(path, seconds=10):
+    s = path.stat()
+    os.utime(path, ns=(s.st_atime_ns, s.st_mtime_ns + seconds * 10**9))
+
+
+def test_unrecorded_post_is_not_fresh(post):
+    assert not Manifest(post.parent).is_fresh(post, False)
+
+
+def test_recorded_post_is_fresh_after_reload(post):
+    manifest = Manifest(post.parent)
+    record(manifest, post)
+    manifest.save()
+
+    manifest = Manifest(post.parent)
+    assert manifest.is_fresh(post, False)
+    assert not manifest.is_fresh(post, True)
+    assert manifest.post_unchanged(post, "digest")
+
+
+def test_touched_post_is_rehashed(post):
+    manifest = Manifest(post.parent)
+    record(manifest, post)
+    touch(post)
+
+    assert manifest.is_fresh(post, False)
+    assert manifest.entries[post.name]["stat"] == file_state(post)[:2]
+
+
+def test_edited_post_is_stale(post):
+    manifest = Manifest(post.parent)
+    record(manifest, post)
+    post.write_text("# Title\n\nchanged\n")
+
+    assert not manifest.is_fresh(post, False)
+
+
+@pytest.mark.parametrize("change", ["edit", "remove"])
+def test_changed_image_is_stale(post, change):
+    manifest = Manifest(post.parent)
+    record(manifest, post)
+    image = post.parent / "a.png"
+    if change == "edit":
+        image.write_bytes(b"\x89PNG other image")
+    else:
+        image.unlink()
+
+    assert not manifest.is_fresh(post, False)
+
+
+def test_save_during_upload_is_not_recorded_as_current(post):
+    # the source is read, then saved again before the upload is recorded
+    source, state = read_source(post)
+    post.write_text("# Title\n\nsaved mid-upload\n")
+    touch(post)
+
+    assert source == b"# Title\n\n![a](a.png)\n"
+    assert not is_current(post, state)
+
+    manifest = Manifest(post.parent)
+    record(manifest, post, state)
+    assert not manifest.is_fresh(post, False)
+
+
+def test_discard(post):
+    manifest = Manifest(post.parent)
+    record(manifest, post)
+    manifest.save()
+
+    manifest = Manifest(post.parent)
+    manifest.discard(post)
+    manifest.save()
+    assert not Manifest(post.parent).is_fresh(post, False)
+
+
+def test_unchanged_manifest_is_not_written(post):
+    Manifest(post.parent).save()
+    assert not (post.parent / Manifest.FILENAME).exists()
+
+
+def test_manifest_set_shares_a_directory(post, tmp_path):
+    manifests = ManifestSet()
+    other = tmp_path / "sub" / "post.md"
+
+    assert manifests[post] is manifests[tmp_path / "other.md"]
+    assert manifests[post] is not manifests[other]
+
+
+def test_post_converted_with_other_settings_is_stale(post):
+    bionic = conversion_settings([Bionic("key")])
+    manifest = Manifest(post.parent)
+    record(manifest, post)
+    manifest.save()
+
+    assert Manifest(post.parent).is_fresh(post, False)
+    assert not Manifest(post.parent, bionic).is_fresh(post, False)
+
+    manifest = Manifest(post.parent, bionic)
+    record(manifest, post)
+    assert manifest.is_fresh(post, False)
+
+
+def test_conversion_settings():
+    # a plain run matches entries recorded before settings were
+    assert conversion_settings([]) == ""
+    assert conversion_settings([], low_memory=True) != ""
+
+    bionic = Bionic("key")
+    digest = conversion_settings([bionic])
+    assert digest not in ("", conversion_settings([], low_memory=True))
+    bionic.saccade = "20"
+    assert conversion_settings([bionic]) != digest
+
+
+@pytest.mark.parametrize(
+    "changed", [{"widths": [960]}, {"formats": ["avif"]}, {"quality": 60}]
+)
+def test_optimizer_settings_change_the_digest(tmp_path, changed):
+    default = {"widths": [480], "formats": ["webp"], "quality": 80}
+    with ImageOptimizer(tmp_path, **default) as optimizer:
+        digest = conversion_settings([], optimizer=optimizer)
+    with ImageOptimizer(tmp_path, **{**default, **changed}) as optimizer:
+        other = conversion_settings([], optimizer=optimizer)
+
+    assert "" != digest != other
@@ -0,0 +1,141 @@
+import base64
+import io
+from email import policy
+from email.parser import BytesParser
+
+import pytest
+import requests
+
+from benchmarks.standins import StubServer, redirect
+from blog_uploader.image_uploaders.imgbb_uploader import ImgbbUploader
+from blog_uploader.image_uploaders.imgur_uploader import ImgurUploader
+from blog_uploader.image_uploaders.multipart import Base64Encoder, MultipartBody
+
+DATA = bytes(range(256)) * 41
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / "a.png"
+    path.write_bytes(DATA)
+    return path
+
+
+def parse(body: MultipartBody) -> dict:
+    message = BytesParser(policy=policy.default).parsebytes(
+        f"Content-Type: {body.content_type}\r\n\r\n".encode() + body.read()
+    )
+    return {
+        part.get_param("name", header="content-disposition"): part
+        for part in message.iter_parts()
+    }
+
+
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 1000, len(DATA)])
+@pytest.mark.parametrize("chunk_size", [3, 4, 1024])
+def test_base64_encoder(tmp_path, size, chunk_size):
+    path = tmp_path / "a.png"
+    path.write_bytes(DATA[:size])
+    encoded = base64.b64encode(DATA[:size])
+
+    with open(path, "rb") as f:
+        encoder = Base64Encoder(f, chunk_size=chunk_size)
+        assert len(encoder) == len(encoded)
+        assert encoder.read() == encoded
+
+
+def test_base64_encoder_starts_at_the_file_position(image):
+    with open(image, "rb") as f:
+        f.seek(100)
+        assert Base64Encoder(f).read() == base64.b64encode(DATA[100:])
+
+
+@pytest.mark.parametrize("offset", [0, 1, 2, 3, 4, 5, 4000, 5000])
+def test_base64_encoder_seek(image, offset):
+    encoded = base64.b64encode(DATA)
+
+    with open(image, "rb") as f:
+        encoder = Base64Encoder(f, chunk_size=1024)
+        encoder.read(2000)
+
+        assert encoder.seek(offset) == offset
+        assert encoder.read() == encoded[offset:]
+        assert encoder.seek(-10, io.SEEK_END) == len(encoded) - 10
+        assert encoder.read() == encoded[-10:]
+
+
+def test_multipart_body(image):
+    with open(image, "rb") as f, open(image, "rb") as g:
+        f.seek(10)
+        body = MultipartBody(
+            [
+                ("key", "value", None, None),
+                ("image", f, 'a "b".png', "image/png"),
+                ("encoded", Base64Encoder(g), None, None),
+            ]
+        )
+        length = len(body)
+        parts = parse(body)
+
+    assert body.tell() == length
+    assert parts["key"].get_content() == "value"
+    assert parts["image"].get_payload(decode=True) == DATA[10:]
+    assert parts["image"].get_filename() == "a %22b%22.png"
+    assert parts["image"].get_content_type() == "image/png"
+    assert base64.b64decode(parts["encoded"].get_payload()) == DATA
+
+
+def test_multipart_body_rewinds(image):
+    with open(image, "rb") as f:
+        body = MultipartBody([("image", f, "a.png", None)])
+        first = body.read()
+        body.read(100)
+
+        for offset in (0, 50, len(first) - 1):
+            body.seek(offset)
+            assert body.read() == first[offset:]
+
+
+@pytest.mark.parametrize("cls", [ImgbbUploader, ImgurUploader])
+@pytest.mark.parametrize("failures", [0, 2])
+def test_upload_retries_resend_the_image(image, cls, failures):
+    with StubServer(failures=failures) as stub, redirect(
+        cls("test", backoff=0), stub.url
+    ) as uploader, open(image, "rb") as f:
+        url = uploader.upload(f)
+
+    # the stub answers with the decoded size of the image it received
+    assert url.rsplit("/", 1)[1] == f"{len(DATA)}.png"
+    assert stub.server.requests == failures + 1
+
+
+def test_upload_gives_up_after_retries(image):
+    with StubServer(failures=3) as stub, redirect(
+        ImgbbUploader("test", retries=2, backoff=0), stub.url
+    ) as uploader, open(image, "rb") as f, pytest.raises(requests.HTTPError):
+        uploader.upload(f)
+
+    assert stub.server.requests == 3
+
+
+def test_upload_many(tmp_path):
+    paths = []
+    for i in range(5):
+        paths.append(tmp_path / f"{i}.png")
+        paths[-1].write_bytes(DATA[: 100 * (i + 1)])
+
+    with StubServer(failures=1) as stub, redirect(
+        ImgurUploader("test", backoff=0), stub.url
+    ) as uploader:
+        files = [open(path, "rb") for path in paths]
+        try:
+            urls = uploader.upload_many(files)
+        finally:
+            for f in files:
+                f.close()
+
+    sizes = [url.rsplit("/", 1)[1] for url in urls]
+    assert sizes == [f"{100 * (i + 1)}.png" for i in range(5)]
+    assert sorted(uploader.delete_key(url) for url in urls) == sorted(
+        str(n) for n in range(2, 7)
+    )
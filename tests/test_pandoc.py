@@ -0,0 +1,93 @@
+import sys
+import textwrap
+
+import pytest
+
+from blog_uploader.exceptions import PostException
+from blog_uploader.pandoc import (
+    ServerBackend,
+    SubprocessBackend,
+    get_backend,
+    use_backend,
+)
+
+# answers like `pandoc server` and `pandoc -f -t`, echoing the text back; a
+# second server refuses to start, and the text "fail" gets a 500
+FAKE_PANDOC = """\
+    #!{python}
+    import json, pathlib, sys
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    started = pathlib.Path(__file__).with_name("started")
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b"3.1")
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if body["text"] == "fail":
+                self.send_response(500)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(json.dumps({{"output": body["text"]}}).encode())
+
+    if sys.argv[1] == "server":
+        if started.exists():
+            sys.exit(1)
+        started.touch()
+        HTTPServer(("127.0.0.1", int(sys.argv[3])), Handler).serve_forever()
+    else:
+        sys.stdout.buffer.write(sys.stdin.buffer.read())
+"""
+
+
+@pytest.fixture
+def pandoc(tmp_path):
+    path = tmp_path / "pandoc"
+    path.write_text(textwrap.dedent(FAKE_PANDOC.format(python=sys.executable)))
+    path.chmod(0o755)
+    return str(path)
+
+
+@pytest.fixture
+def backend(pandoc):
+    with ServerBackend(1, executable=pandoc) as backend:
+        yield backend
+
+
+def test_error_response_is_a_post_exception(backend):
+    (worker,) = backend._workers
+    pid = worker.process.pid
+
+    with pytest.raises(PostException):
+        backend.convert(b"fail", "gfm", "json")
+
+    # the server answered, so it is kept
+    assert worker.process.pid == pid
+    assert backend.convert(b"ok", "gfm", "json") == b"ok"
+
+
+def test_dead_server_falls_back_to_subprocess(backend):
+    (worker,) = backend._workers
+    worker.stop()
+
+    # the fake pandoc refuses to start a second server
+    assert backend.convert(b"ok", "gfm", "json") == b"ok"
+    assert not worker.running
+
+
+def test_use_backend_restores_the_previous_backend():
+    previous = get_backend()
+
+    with use_backend(SubprocessBackend()) as current:
+        assert get_backend() is current
+
+    assert get_backend() is previous
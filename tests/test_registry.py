@@ -0,0 +1,168 @@
+import datetime
+import time
+
+import pytest
+
+from blog_uploader.image_uploaders.gridfs_uploader import GridFsUploader
+from blog_uploader.image_uploaders.registry import ImageRegistry, reference_writes
+from blog_uploader.image_uploaders.s3_uploader import S3Uploader
+from blog_uploader.migrations import migrate
+from blog_uploader.schemas import ObjectId
+
+HOUR = datetime.timedelta(hours=1)
+
+
+@pytest.fixture
+def gridfs(db):
+    return GridFsUploader(db)
+
+
+@pytest.fixture
+def registry(db, gridfs):
+    return ImageRegistry(db, gridfs)
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / "a.png"
+    path.write_bytes(b"\x89PNG" + b"x" * 100)
+    return path
+
+
+def upload(uploader, path) -> str:
+    with open(path, "rb") as f:
+        return uploader.upload(f)
+
+
+def link(db, post_id, urls):
+    db.images.bulk_write(reference_writes(post_id, urls))
+
+
+def expired() -> datetime.timedelta:
+    # released times are stored to the millisecond
+    time.sleep(0.01)
+    return datetime.timedelta(0)
+
+
+def test_uploader_keyed_by_name_is_refused(db, s3):
+    with pytest.raises(ValueError):
+        ImageRegistry(db, S3Uploader("test", "test", "bucket", client=s3))
+    ImageRegistry(
+        db, S3Uploader("test", "test", "bucket", client=s3, content_addressed=True)
+    )
+
+
+def test_upload_is_content_addressed(db, registry, image, tmp_path):
+    copy = tmp_path / "b.png"
+    copy.write_bytes(image.read_bytes())
+
+    assert upload(registry, image) == upload(registry, copy)
+    assert db.images.count_documents({}) == 1
+    assert db.fs.files.count_documents({}) == 1
+
+
+def test_linked_image_is_kept(db, registry, image):
+    link(db, ObjectId(), [upload(registry, image)])
+
+    report = registry.collect(grace=expired())
+    assert (report.removed, report.kept) == (0, 0)
+    assert db.fs.files.count_documents({}) == 1
+
+
+def test_released_image_waits_for_grace(db, registry, image):
+    post_id = ObjectId()
+    link(db, post_id, [upload(registry, image)])
+    registry.release(post_id)
+
+    assert registry.collect(grace=HOUR).removed == 0
+    assert db.fs.files.count_documents({}) == 1
+
+
+def test_released_image_is_collected(db, registry, image):
+    post_id = ObjectId()
+    link(db, post_id, [upload(registry, image)])
+    registry.release(post_id)
+
+    report = registry.collect(grace=expired(), dry_run=True)
+    assert report.removed == 1
+    assert db.fs.files.count_documents({}) == 1
+
+    report = registry.collect(grace=expired())
+    assert (report.removed, report.bytes) == (1, image.stat().st_size)
+    assert db.images.count_documents({}) == 0
+    assert db.fs.files.count_documents({}) == 0
+
+
+def test_reused_image_is_not_collected(db, registry, image, tmp_path):
+    # the image was released long ago and is found again by a post that has
+    # not been written yet
+    link(db, ObjectId(), [upload(registry, image)])
+    db.images.update_many(
+        {}, {"$set": {"posts": [], "released": datetime.datetime(2000, 1, 1)}}
+    )
+    copy = tmp_path / "b.png"
+    copy.write_bytes(image.read_bytes())
+    upload(registry, copy)
+
+    assert registry.collect(grace=HOUR).removed == 0
+    assert db.fs.files.count_documents({}) == 1
+
+
+def test_dropped_image_is_released(db, registry, image, tmp_path):
+    other = tmp_path / "b.png"
+    other.write_bytes(b"\x89PNG" + b"y" * 100)
+    post_id = ObjectId()
+    kept, dropped = upload(registry, image), upload(registry, other)
+    link(db, post_id, [kept, dropped])
+    link(db, post_id, [kept])
+
+    assert registry.collect(grace=expired()).removed == 1
+    assert [doc["url"] for doc in db.images.find()] == [kept]
+
+
+def test_image_linked_by_an_older_post_is_kept(db, registry, gridfs, image):
+    # a post from before the registry links a blob the registry later adopts
+    url = upload(gridfs, image)
+    old = ObjectId()
+    db.posts.insert_one({"_id": old, "body": f"![a]({url})", "image": None})
+    migrate(db)
+
+    new = ObjectId()
+    assert upload(registry, image) == url
+    link(db, new, [url])
+    registry.release(new)
+
+    assert registry.collect(grace=expired()).removed == 0
+    assert db.images.find_one()["posts"] == [old]
+    assert db.fs.files.count_documents({}) == 1
+
+    db.posts.delete_one({"_id": old})
+    registry.release(old)
+    assert registry.collect(grace=expired()).removed == 1
+    assert db.fs.files.count_documents({}) == 0
+
+
+def test_cover_image_is_kept(db, registry, image):
+    url = upload(registry, image)
+    db.posts.insert_one({"_id": ObjectId(), "body": "", "image": url})
+
+    assert registry.collect(grace=expired()).removed == 0
+    assert db.fs.files.count_documents({}) == 1
+
+
+def test_concurrent_upload_keeps_the_registered_blob(db, registry, gridfs, image):
+    # another post uploads and registers the same content between our lookup
+    # and our registration
+    upload_many = gridfs.upload_many
+
+    def racing_upload_many(files, **kwargs):
+        winner = ImageRegistry(db, GridFsUploader(db, collection="other"))
+        urls.append(upload(winner, image))
+        return upload_many(files, **kwargs)
+
+    urls: list = []
+    gridfs.upload_many = racing_upload_many
+
+    assert upload(registry, image) == urls[0]
+    assert db.images.count_documents({}) == 1
+    assert db.fs.files.count_documents({}) == 0
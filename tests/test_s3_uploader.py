@@ -0,0 +1,140 @@
+import hashlib
+import io
+
+import pytest
+from boto3.s3.transfer import TransferConfig
+
+from blog_uploader import profiling
+from blog_uploader.image_uploaders.exceptions import ChecksumMismatch
+from blog_uploader.image_uploaders.s3_uploader import MiB, S3Uploader
+
+BUCKET = "blog-uploader-test"
+
+
+@pytest.fixture
+def uploader(s3):
+    # S3 parts are at least 5 MiB, so a 12 MiB image takes three of them
+    return S3Uploader(
+        "test",
+        "test",
+        BUCKET,
+        prefix="images/",
+        client=s3,
+        transfer_config=TransferConfig(
+            multipart_threshold=5 * MiB, multipart_chunksize=5 * MiB
+        ),
+    )
+
+
+@pytest.fixture
+def stats():
+    profiling.enable()
+    try:
+        with profiling.profile("test") as current:
+            yield current
+    finally:
+        profiling.disable()
+
+
+def write(path, size, seed=b"image"):
+    block = hashlib.sha256(seed).digest()
+    path.write_bytes((block * (size // len(block) + 1))[:size])
+    return path
+
+
+def upload(uploader, path) -> str:
+    with open(path, "rb") as f:
+        return uploader.upload(f)
+
+
+def stored(s3, key) -> bytes:
+    return s3.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+
+
+def test_upload(uploader, s3, tmp_path):
+    path = write(tmp_path / "a b.png", 1024)
+
+    assert upload(uploader, path) == (
+        f"https://s3.amazonaws.com/{BUCKET}/images/a%20b.png"
+    )
+    assert stored(s3, "images/a b.png") == path.read_bytes()
+    assert uploader.delete_key(upload(uploader, path)) == "images/a b.png"
+
+
+@pytest.mark.parametrize("size", [1024, 12 * MiB])
+def test_listed_etag_skips_upload(uploader, s3, tmp_path, stats, size):
+    path = write(tmp_path / "a.png", size)
+    upload(uploader, path)
+
+    # a fresh uploader only knows what the bucket listing says
+    again = S3Uploader(
+        "test",
+        "test",
+        BUCKET,
+        prefix="images/",
+        client=s3,
+        transfer_config=uploader.transfer_config,
+    )
+    upload(again, path)
+    assert stats.counters == {"upload.bytes": size, "upload.existing": 1}
+
+
+def test_changed_content_is_uploaded(uploader, s3, tmp_path, stats):
+    path = write(tmp_path / "a.png", 1024)
+    upload(uploader, path)
+    write(path, 1024, seed=b"other")
+    upload(uploader, path)
+
+    assert "upload.existing" not in stats.counters
+    assert stored(s3, "images/a.png") == path.read_bytes()
+
+
+def test_large_image_is_uploaded_in_parts(uploader, s3, tmp_path):
+    path = write(tmp_path / "large.png", 12 * MiB)
+    upload(uploader, path)
+
+    etag = s3.head_object(Bucket=BUCKET, Key="images/large.png")["ETag"]
+    with open(path, "rb") as f:
+        assert etag.strip('"') == uploader.etag(f, 12 * MiB)
+    assert etag.strip('"').endswith("-3")
+    assert stored(s3, "images/large.png") == path.read_bytes()
+
+
+def test_delete_many(uploader, s3, tmp_path):
+    urls = [upload(uploader, write(tmp_path / f"{i}.png", 64)) for i in range(3)]
+    uploader.delete_many([uploader.delete_key(url) for url in urls[:2]])
+
+    listed = s3.list_objects_v2(Bucket=BUCKET)["Contents"]
+    assert [obj["Key"] for obj in listed] == ["images/2.png"]
+    assert list(uploader.index) == ["images/2.png"]
+
+
+def test_content_addressed_keys(s3, tmp_path):
+    # the same name in two directories holds two different images
+    uploader = S3Uploader("test", "test", BUCKET, client=s3, content_addressed=True)
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    a = write(tmp_path / "a" / "image.PNG", 1024, b"a")
+    b = write(tmp_path / "b" / "image.PNG", 1024, b"b")
+
+    url_a, url_b = upload(uploader, a), upload(uploader, b)
+    assert url_a != url_b
+    assert uploader.delete_key(url_a).endswith(".png")
+    assert stored(s3, uploader.delete_key(url_a)) == a.read_bytes()
+    assert stored(s3, uploader.delete_key(url_b)) == b.read_bytes()
+
+
+@pytest.mark.parametrize("size", [1024, 12 * MiB])
+def test_corrupted_upload_is_removed(uploader, s3, tmp_path, size):
+    path = write(tmp_path / "a.png", size)
+    upload_fileobj = s3.upload_fileobj
+
+    def corrupting_upload_fileobj(file, *args, **kwargs):
+        return upload_fileobj(io.BytesIO(file.read()[:-1] + b"?"), *args, **kwargs)
+
+    s3.upload_fileobj = corrupting_upload_fileobj
+    with pytest.raises(ChecksumMismatch):
+        upload(uploader, path)
+
+    assert "Contents" not in s3.list_objects_v2(Bucket=BUCKET)
+    assert "images/a.png" not in uploader.index
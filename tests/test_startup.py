@@ -0,0 +1,13 @@
+import pytest
+
+from benchmarks.bench_startup import ACTIONS, import_profile
+
+
+@pytest.mark.parametrize("action", ACTIONS)
+def test_startup_imports(action):
+    # wall-clock budgets depend on the machine and are left to
+    # `python -m benchmarks.bench_startup --check`
+    _, forbidden = ACTIONS[action]
+    _, modules = import_profile(action)
+
+    assert [m for m in forbidden if m in modules] == []